@@ -3,9 +3,10 @@ from settings import PLAYER_SPEED
 import random
 
 class AnimationController:
-    def __init__(self, hero_sprite, villain_sprite):
+    def __init__(self, hero_sprite, villain_sprite, sfx=None):
         self.hero = hero_sprite
         self.villain = villain_sprite
+        self.sfx = sfx  # SFXPool that plays each action's sound effect, if any
         self.hero_movement = {"up": False, "down": False, "left": False, "right": False}
         self.villain_movement = {"up": False, "down": False, "left": False, "right": False}
         self.movement_speed = PLAYER_SPEED  # Now properly defined
@@ -24,6 +25,11 @@ class AnimationController:
                 self._handle_action(self.hero, self.hero_movement, action, direction)
             elif char == "villain":
                 self._handle_action(self.villain, self.villain_movement, action, direction)
+            else:
+                continue
+
+            if self.sfx:
+                self.sfx.trigger(action)
 
     def _handle_action(self, sprite, movement_dict, action, direction):
         """Update sprite state based on validated instruction"""
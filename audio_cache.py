@@ -0,0 +1,112 @@
+# audio_cache.py
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from settings import TTS_CACHE_DIR, TTS_CACHE_MAX_BYTES
+
+
+class AudioCache:
+    """Content-addressed on-disk cache for synthesized speech.
+
+    Entries are keyed by a hash of (model, voice, text, format) and evicted
+    least-recently-used first once the total size exceeds max_bytes.
+    """
+
+    def __init__(self, cache_dir=TTS_CACHE_DIR, max_bytes=TTS_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.total_bytes = 0
+        self._entries = OrderedDict()  # key -> (path, size), oldest first
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_index()
+
+    @staticmethod
+    def make_key(model, voice, text, response_format):
+        """Hash the synthesis parameters into a cache key"""
+        payload = json.dumps([model, voice, text, response_format], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Return cached audio bytes for key, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            path, size = entry
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+                os.utime(path)
+            except OSError:
+                self._forget(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key, data, extension="wav"):
+        """Store audio bytes under key and evict old entries if over budget"""
+        path = os.path.join(self.cache_dir, f"{key}.{extension}")
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with self._lock:
+            try:
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"Failed to cache audio {key}: {e}")
+                return
+            if key in self._entries:
+                self._forget(key)
+            self._entries[key] = (path, len(data))
+            self.total_bytes += len(data)
+            self._evict()
+
+    def stats(self):
+        """Hit/miss counters and current cache size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self.total_bytes
+            }
+
+    def _load_index(self):
+        """Rebuild the LRU order from file modification times"""
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".tmp"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            files.append((st.st_mtime, name.split(".", 1)[0], path, st.st_size))
+        for _, key, path, size in sorted(files):
+            self._entries[key] = (path, size)
+            self.total_bytes += size
+        self._evict()
+
+    def _forget(self, key):
+        path, size = self._entries.pop(key)
+        self.total_bytes -= size
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and self._entries:
+            key, (path, size) = self._entries.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,247 @@
+# audio_player.py
+import io
+import struct
+import threading
+import pyglet
+from pyglet.media.codecs.base import AudioData, AudioFormat
+from settings import TTS_VOLUME
+
+# Silence handed to the audio thread, in seconds, while streamed speech hasn't arrived yet
+STREAM_UNDERRUN_SILENCE = 0.05
+
+
+def parse_wav_header(data):
+    """Return (AudioFormat, header_length, data_size) once the header has arrived.
+
+    Returns None while more bytes are needed. data_size is None when the
+    stream doesn't declare its length (common for streamed WAV responses).
+    """
+    if len(data) < 12:
+        return None
+    if data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        raise ValueError("Not a WAV stream")
+    pos = 12
+    audio_format = None
+    while pos + 8 <= len(data):
+        chunk_id = data[pos:pos + 4]
+        size = struct.unpack("<I", data[pos + 4:pos + 8])[0]
+        if chunk_id == b"data":
+            if audio_format is None:
+                raise ValueError("WAV data chunk before fmt chunk")
+            data_size = None if size in (0, 0xFFFFFFFF) else size
+            return audio_format, pos + 8, data_size
+        if pos + 8 + size > len(data):
+            return None
+        if chunk_id == b"fmt ":
+            _, channels, rate, _, _, bits = struct.unpack("<HHIIHH", data[pos + 8:pos + 24])
+            audio_format = AudioFormat(channels=channels, sample_size=bits, sample_rate=rate)
+        pos += 8 + size + (size & 1)
+    return None
+
+
+def wav_duration(audio_data):
+    """Duration in seconds of a complete WAV clip, read from its header"""
+    parsed = parse_wav_header(audio_data)
+    if parsed is None:
+        return 0.0
+    audio_format, header_length, data_size = parsed
+    if data_size is None:
+        data_size = len(audio_data) - header_length
+    return data_size / audio_format.bytes_per_second
+
+
+class StreamingWavSource(pyglet.media.StreamingSource):
+    """A pyglet source fed with WAV bytes from another thread as they arrive"""
+
+    def __init__(self):
+        self.audio_format = None
+        self.video_format = None
+        self._duration = None
+        self._header = bytearray()
+        self._pcm = bytearray()
+        self._remaining = None
+        self._total_pcm = 0
+        self._timestamp = 0.0
+        self._finished = False
+        self._lock = threading.Lock()
+
+    def feed(self, chunk):
+        """Append bytes from the network; returns True once the format is known"""
+        with self._lock:
+            if self.audio_format is None:
+                self._header += chunk
+                parsed = parse_wav_header(bytes(self._header))
+                if parsed is None:
+                    return False
+                self.audio_format, header_length, self._remaining = parsed
+                chunk = bytes(self._header[header_length:])
+                self._header = bytearray()
+            if self._remaining is not None:
+                chunk = chunk[:self._remaining]
+                self._remaining -= len(chunk)
+            self._pcm += chunk
+            self._total_pcm += len(chunk)
+            return True
+
+    def finish(self):
+        """Mark the stream complete so the player reaches end-of-stream"""
+        with self._lock:
+            self._finished = True
+            if self.audio_format:
+                self._duration = self._total_pcm / self.audio_format.bytes_per_second
+
+    def get_audio_data(self, num_bytes, compensation_time=0.0):
+        # Runs on pyglet's audio thread, so never wait here for the network
+        frame = self.audio_format.bytes_per_frame
+        with self._lock:
+            size = min(num_bytes, len(self._pcm))
+            size -= size % frame
+            if size:
+                data = bytes(self._pcm[:size])
+                del self._pcm[:size]
+            elif self._finished:
+                return None
+            else:
+                # Network underrun: pad with a little silence instead of ending
+                size = int(self.audio_format.bytes_per_second * STREAM_UNDERRUN_SILENCE)
+                size -= size % frame
+                data = b"\x00" * size
+        duration = size / self.audio_format.bytes_per_second
+        audio_data = AudioData(data, size, timestamp=self._timestamp, duration=duration)
+        self._timestamp += duration
+        return audio_data
+
+    def seek(self, timestamp):
+        pass
+
+
+class InProcessPlayback:
+    """A single clip playing on a pyglet Player, stoppable from any thread"""
+
+    def __init__(self, source, volume):
+        self.source = source
+        self.volume = volume
+        self.player = None
+        self.finished = threading.Event()
+
+    def start(self, delta_time=0):
+        """Create and start the player; runs on the pyglet clock"""
+        if self.finished.is_set():
+            return
+        self.player = pyglet.media.Player()
+        self.player.volume = self.volume
+        self.player.push_handlers(on_eos=self._on_eos)
+        self.player.queue(self.source)
+        self.player.play()
+
+    def terminate(self):
+        """Stop playback early"""
+        self.finished.set()
+        pyglet.clock.schedule_once(self._release, 0)
+
+    def wait(self, timeout=None):
+        """Block until the clip ends or is stopped"""
+        self.finished.wait(timeout)
+        self.finished.set()
+        pyglet.clock.schedule_once(self._release, 0)
+
+    def _on_eos(self):
+        self.finished.set()
+
+    def _release(self, delta_time=0):
+        if self.player:
+            self.player.pause()
+            self.player.delete()
+            self.player = None
+
+
+class AudioPlayer:
+    """Decodes WAV bytes from memory and plays them through pyglet's media layer.
+
+    With a mixer (see mixer.get_mixer) clips go to its voice bus instead of
+    getting a player of their own.
+    """
+
+    def __init__(self, volume=TTS_VOLUME, mixer=None):
+        self.volume = volume
+        self.mixer = mixer
+
+    def decode(self, audio_data):
+        """Decode WAV bytes into a static in-memory pyglet source"""
+        return pyglet.media.load("speech.wav", file=io.BytesIO(audio_data), streaming=False)
+
+    def play(self, audio_data, on_start=None):
+        """Play WAV bytes, blocking the calling (worker) thread until playback ends.
+
+        The player itself is started on the pyglet clock so all media calls
+        happen on the frame thread. on_start receives the playback object so
+        callers can stop it early.
+        """
+        if self.mixer is not None:
+            channel = self.mixer.play_wav("voice", audio_data, self.volume)
+            if on_start:
+                on_start(channel)
+            channel.wait(timeout=channel.duration + 1.0)
+            channel.stop()
+            return
+        playback = InProcessPlayback(self.decode(audio_data), self.volume)
+        if on_start:
+            on_start(playback)
+        pyglet.clock.schedule_once(playback.start, 0)
+        # Guard against a lost on_eos event with the clip's own duration
+        duration = playback.source.duration or 0
+        playback.wait(timeout=duration + 1.0 if duration else None)
+
+    def play_stream(self, chunks, on_start=None):
+        """Play WAV bytes from an iterable of chunks, starting on the first PCM data.
+
+        Blocks the calling (worker) thread while feeding the stream and until
+        playback ends.
+        """
+        if self.mixer is not None:
+            self._play_stream_mixed(chunks, on_start)
+            return
+        source = StreamingWavSource()
+        playback = InProcessPlayback(source, self.volume)
+        if on_start:
+            on_start(playback)
+        started = False
+        try:
+            for chunk in chunks:
+                if playback.finished.is_set():
+                    break
+                if source.feed(chunk) and not started:
+                    pyglet.clock.schedule_once(playback.start, 0)
+                    started = True
+        finally:
+            if hasattr(chunks, "close"):
+                chunks.close()
+            source.finish()
+        if not started:
+            if playback.finished.is_set():
+                return
+            raise ValueError("Speech stream ended before any audio arrived")
+        duration = source.duration or 0
+        playback.wait(timeout=duration + 1.0)
+
+    def _play_stream_mixed(self, chunks, on_start=None):
+        channel = self.mixer.open_stream("voice", self.volume)
+        if on_start:
+            on_start(channel)
+        try:
+            for chunk in chunks:
+                if channel.finished.is_set():
+                    break
+                channel.feed(chunk)
+        finally:
+            if hasattr(chunks, "close"):
+                chunks.close()
+            channel.finish()
+        if channel.audio_format is None:
+            stopped = channel.finished.is_set()
+            channel.stop()
+            if stopped:
+                return
+            raise ValueError("Speech stream ended before any audio arrived")
+        channel.wait(timeout=channel.duration + 1.0)
+        channel.stop()
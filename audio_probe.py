@@ -0,0 +1,129 @@
+# audio_probe.py
+import io
+import json
+import os
+import shutil
+import socket
+import subprocess
+import threading
+import time
+import wave
+from settings import AUDIO_PROBE_CACHE, TTS_AUDIO_DEVICES
+
+_backend = None
+_lock = threading.Lock()
+
+
+def ffplay_command(volume=0.5):
+    """Build the ffplay command line that plays WAV data from stdin"""
+    return ["ffplay", "-autoexit", "-nodisp", "-vn", "-nostats",
+            "-loglevel", "error", "-af", f"volume={volume}", "-"]
+
+
+def ffplay_env(device=None):
+    """Environment that routes ffplay to a device.
+
+    ffplay has no output option of its own; it plays through SDL, which
+    reads the driver from SDL_AUDIODRIVER and the device from AUDIODEV.
+    A device is a driver name ("pulseaudio") or "driver:device"
+    ("alsa:hw:1,0"). None keeps SDL's own choice.
+    """
+    env = dict(os.environ)
+    if device:
+        driver, _, name = device.partition(":")
+        env["SDL_AUDIODRIVER"] = driver
+        if name:
+            env["AUDIODEV"] = name
+    return env
+
+
+def _silent_wav(duration=0.05, rate=22050):
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(b"\x00\x00" * int(rate * duration))
+    return buf.getvalue()
+
+
+def _probe_pyglet():
+    try:
+        import pyglet
+        driver = pyglet.media.get_audio_driver()
+    except Exception as e:
+        print(f"pyglet audio unavailable: {e}")
+        return False
+    return driver is not None and type(driver).__name__ != "SilentDriver"
+
+
+def _probe_ffplay_device(device, sample):
+    try:
+        proc = subprocess.run(ffplay_command(volume=0), input=sample, env=ffplay_env(device),
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=5)
+        return proc.returncode == 0
+    except Exception:
+        return False
+
+
+def probe_audio_backend():
+    """Find a working audio sink: pyglet in-process first, then ffplay devices"""
+    if _probe_pyglet():
+        return {"backend": "pyglet", "device": None}
+    if shutil.which("ffplay"):
+        sample = _silent_wav()
+        for device in [None] + list(TTS_AUDIO_DEVICES):
+            if _probe_ffplay_device(device, sample):
+                return {"backend": "ffplay", "device": device}
+    return {"backend": None, "device": None}
+
+
+def _load_cached(host):
+    if not AUDIO_PROBE_CACHE or not os.path.exists(AUDIO_PROBE_CACHE):
+        return None
+    try:
+        with open(AUDIO_PROBE_CACHE) as f:
+            result = json.load(f).get(host)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable audio probe cache: {e}")
+        return None
+    if result and result.get("device") not in [None] + list(TTS_AUDIO_DEVICES):
+        return None  # Probed with a device list that has since changed
+    return result
+
+
+def _save_cached(host, result):
+    if not AUDIO_PROBE_CACHE:
+        return
+    try:
+        data = {}
+        if os.path.exists(AUDIO_PROBE_CACHE):
+            with open(AUDIO_PROBE_CACHE) as f:
+                data = json.load(f)
+        data[host] = dict(result, probed_at=time.time())
+        os.makedirs(os.path.dirname(AUDIO_PROBE_CACHE) or ".", exist_ok=True)
+        with open(AUDIO_PROBE_CACHE, "w") as f:
+            json.dump(data, f, indent=2)
+    except (OSError, ValueError) as e:
+        print(f"Failed to save audio probe cache: {e}")
+
+
+def get_audio_backend(refresh=False):
+    """Return the probed audio backend, probing at most once per process.
+
+    Results are persisted per host in AUDIO_PROBE_CACHE, so later runs skip
+    the probe entirely unless refresh is True. A failed probe (no backend)
+    is never persisted, so a fixed audio setup is picked up next run.
+    """
+    global _backend
+    with _lock:
+        if _backend is not None and not refresh:
+            return _backend
+        host = socket.gethostname()
+        result = None if refresh else _load_cached(host)
+        if result is None:
+            result = probe_audio_backend()
+            if result["backend"]:
+                _save_cached(host, result)
+        _backend = {"backend": result.get("backend"), "device": result.get("device")}
+        return _backend
@@ -0,0 +1,150 @@
+# batch_generate.py
+"""
+Headless batch story generation.
+
+Reads one prompt per line from a prompt file and writes one normalized
+story per line to a JSONL file. Each story is keyed by a hash of its
+prompt text, so finished prompts are skipped on restart even if the
+prompt file was edited, and an interrupted overnight run can simply be
+started again.
+
+    python batch_generate.py prompts.txt stories.jsonl --concurrency 8 --rpm 30 --tpm 6000
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from rate_limiter import set_rate_limits
+from settings import GROQ_CHAT_RPM, GROQ_CHAT_TPM, STORY_BACKEND
+from story_backends import BACKENDS
+import story_fetcher
+
+
+def load_prompts(path):
+    """Non-empty lines of the prompt file"""
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def prompt_id(prompt):
+    """Checkpoint key for a prompt, stable across reordering of the prompt file"""
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+
+
+def load_checkpoint(path):
+    """Ids of prompts already written to the output file"""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                done.add(json.loads(line)["id"])
+            except (ValueError, KeyError):
+                continue  # Partial last line from an interrupted run
+    return done
+
+
+def generate(prompt, args):
+    story, instructions, music = story_fetcher.get_groq_story(
+        prompt=prompt,
+        max_tokens=args.max_tokens,
+        temperature=args.temperature,
+        fallback=False,
+        backend=args.backend
+    )
+    return {
+        "id": prompt_id(prompt),
+        "prompt": prompt,
+        "story": story,
+        "instructions": instructions,
+        "music": music
+    }
+
+
+def report(written, failed, started, tokens_start):
+    elapsed = max(time.monotonic() - started, 1e-6)
+    tokens = story_fetcher.TOKEN_USAGE["total_tokens"] - tokens_start
+    print(f"{written} stories, {failed} failed, {written / elapsed * 60:.1f} stories/min, "
+          f"{tokens / elapsed:.1f} tokens/s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a JSONL corpus of stories")
+    parser.add_argument("prompts", help="Text file with one prompt per line")
+    parser.add_argument("output", help="JSONL file to append stories to (doubles as the checkpoint)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Requests in flight")
+    parser.add_argument("--rpm", type=int, default=GROQ_CHAT_RPM, help="Requests per minute limit")
+    parser.add_argument("--tpm", type=int, default=GROQ_CHAT_TPM, help="Tokens per minute limit")
+    parser.add_argument("--max-tokens", type=int, default=500)
+    parser.add_argument("--temperature", type=float, default=0.7)
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default=STORY_BACKEND,
+                        help="Story backend; 'template' runs offline for pipeline benchmarks")
+    parser.add_argument("--report-every", type=int, default=25, help="Print throughput every N stories")
+    args = parser.parse_args(argv)
+
+    set_rate_limits("chat", args.rpm, args.tpm)
+    prompts = load_prompts(args.prompts)
+    done = load_checkpoint(args.output)
+    todo = {}
+    skipped = 0
+    for prompt in prompts:
+        key = prompt_id(prompt)
+        if key in done:
+            skipped += 1
+        else:
+            todo.setdefault(key, prompt)  # Duplicate prompts are generated once
+    print(f"{len(prompts)} prompts, {skipped} already done, {len(todo)} to generate")
+
+    written = failed = 0
+    started = time.monotonic()
+    tokens_start = story_fetcher.TOKEN_USAGE["total_tokens"]
+    # Managed by hand, not in a with-block: its exit would wait for every running request
+    executor = ThreadPoolExecutor(max_workers=args.concurrency)
+    with open(args.output, "a", encoding="utf-8") as out:
+        futures = {executor.submit(generate, p, args): p for p in todo.values()}
+        pending = set(futures)
+
+        def save(future):
+            nonlocal written, failed
+            pending.discard(future)
+            try:
+                record = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"Prompt {futures[future]!r} failed: {e}", file=sys.stderr)
+                return
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            written += 1
+            if written % args.report_every == 0:
+                report(written, failed, started, tokens_start)
+
+        try:
+            for future in as_completed(futures):
+                save(future)
+        except KeyboardInterrupt:
+            executor.shutdown(wait=False, cancel_futures=True)
+            running = [future for future in pending if not future.cancelled()]
+            print(f"Interrupted; saving {len(running)} in-flight stories (Ctrl-C again to drop them)")
+            try:
+                for future in as_completed(running):
+                    save(future)
+            except KeyboardInterrupt:
+                out.flush()
+                report(written, failed, started, tokens_start)
+                dropped = sum(1 for future in running if future in pending)
+                print(f"Dropped {dropped} in-flight stories; finished ones are saved, rerun to resume")
+                # Executor threads are joined at interpreter exit, which would wait for the dropped requests
+                os._exit(130)
+            print("Finished stories are saved, rerun to resume")
+    executor.shutdown()
+    report(written, failed, started, tokens_start)
+    return 0 if not failed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
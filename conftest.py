@@ -0,0 +1,26 @@
+# conftest.py
+import threading
+import pytest
+from mock_groq_server import FaultProfile, MockGroqServer
+
+# The *_test.py scripts call the live API or open windows; pytest only runs test/test_*.py
+collect_ignore_glob = ["*_test.py", "test.py", "test/*_test.py", "test/transform.py"]
+
+
+@pytest.fixture
+def mock_groq():
+    """Start a MockGroqServer on a free port: mock_groq(rpm=None, token_delay=0, **FaultProfile kwargs)"""
+    servers = []
+
+    def start(rpm=None, token_delay=0.0, chunk_size=4096, speech_speed=4.0, **profile):
+        server = MockGroqServer(("127.0.0.1", 0), FaultProfile(**profile), rpm, token_delay, chunk_size,
+                                speech_speed)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        server.url = f"http://127.0.0.1:{server.server_address[1]}"
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
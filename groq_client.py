@@ -0,0 +1,93 @@
+# groq_client.py
+import asyncio
+import os
+import threading
+import httpx
+from dotenv import load_dotenv
+from groq import AsyncGroq, DefaultAsyncHttpxClient, DefaultHttpxClient, Groq
+from settings import (GROQ_CONNECT_TIMEOUT, GROQ_KEEPALIVE_EXPIRY, GROQ_MAX_CONNECTIONS,
+                      GROQ_MAX_KEEPALIVE_CONNECTIONS, GROQ_READ_TIMEOUT)
+
+_client = None
+_async_client = None
+_loop = None
+_lock = threading.Lock()
+
+
+def _pool_limits():
+    return httpx.Limits(
+        max_connections=GROQ_MAX_CONNECTIONS,
+        max_keepalive_connections=GROQ_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=GROQ_KEEPALIVE_EXPIRY
+    )
+
+
+def _timeout():
+    return httpx.Timeout(GROQ_READ_TIMEOUT, connect=GROQ_CONNECT_TIMEOUT)
+
+
+def make_http_client():
+    """httpx client with a tuned keep-alive connection pool and timeouts"""
+    return DefaultHttpxClient(limits=_pool_limits(), timeout=_timeout())
+
+
+def get_groq_client():
+    """Return the process-wide Groq client shared by story and TTS calls.
+
+    One client means one connection pool, so TLS handshakes are paid once
+    and later requests reuse warm keep-alive connections. The base URL can
+    be pointed at a local stand-in server with GROQ_BASE_URL.
+    """
+    global _client
+    with _lock:
+        if _client is None:
+            load_dotenv()
+            _client = Groq(
+                api_key=os.getenv("GROQ_API_KEY"),
+                base_url=os.getenv("GROQ_BASE_URL") or None,
+                max_retries=0,  # Retries and backoff are handled by rate_limiter.call_with_retry
+                http_client=make_http_client()
+            )
+        return _client
+
+
+def _get_loop():
+    """Background event loop that owns the async client and its connection pool"""
+    global _loop
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="groq-async", daemon=True).start()
+        return _loop
+
+
+def run_async(coro):
+    """Schedule a coroutine on the shared async loop, returning a concurrent Future"""
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop())
+
+
+def get_async_groq_client():
+    """Process-wide AsyncGroq client; only use it from coroutines passed to run_async.
+
+    Async requests can be cancelled mid-flight (the connection is dropped),
+    which hedged requests rely on.
+    """
+    global _async_client
+    if _async_client is None:
+        load_dotenv()
+        _async_client = AsyncGroq(
+            api_key=os.getenv("GROQ_API_KEY"),
+            base_url=os.getenv("GROQ_BASE_URL") or None,
+            max_retries=0,
+            http_client=DefaultAsyncHttpxClient(limits=_pool_limits(), timeout=_timeout())
+        )
+    return _async_client
+
+
+def close_groq_client():
+    """Close the shared client's connection pool"""
+    global _client
+    with _lock:
+        if _client is not None:
+            _client.close()
+            _client = None
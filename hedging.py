@@ -0,0 +1,96 @@
+# hedging.py
+import asyncio
+import threading
+import time
+from collections import deque
+from settings import (STORY_HEDGE_DEFAULT_DEADLINE, STORY_HEDGE_MIN_SAMPLES, STORY_HEDGE_PERCENTILE,
+                      STORY_HEDGE_WINDOW)
+
+
+class LatencyTracker:
+    """Rolling window of request latencies used to pick the hedge deadline"""
+
+    def __init__(self, percentile=STORY_HEDGE_PERCENTILE, window=STORY_HEDGE_WINDOW,
+                 default=STORY_HEDGE_DEFAULT_DEADLINE, min_samples=STORY_HEDGE_MIN_SAMPLES):
+        self.percentile = percentile
+        self.default = default
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def deadline(self):
+        """Latency at the configured percentile, or the default until there's enough data"""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return self.default
+            samples = sorted(self._samples)
+        index = min(len(samples) - 1, int(len(samples) * self.percentile / 100))
+        return samples[index]
+
+
+async def hedged(primary, backup, deadline, validate=None, tracker=None):
+    """Run primary(); if it hasn't produced a valid result by deadline, also run backup().
+
+    primary and backup are coroutine functions. The first valid result wins
+    and the other request is cancelled. If the primary fails before the
+    deadline, the backup starts immediately. Returns (result, "primary" or
+    "backup"). If neither result is valid the last invalid one is returned
+    so the caller can still try to salvage it; if both raise, the last
+    error is raised.
+
+    Only the primary's latency is recorded in tracker: its full time when
+    it returns, or, when it loses and is cancelled, the time it had run as
+    a lower bound (never below deadline). Recording winners only would keep
+    every sample under deadline + backup latency and ratchet the deadline
+    down.
+    """
+    validate = validate or (lambda result: True)
+    started = {}
+    recorded = False
+
+    def record_primary(elapsed):
+        nonlocal recorded
+        if tracker and not recorded:
+            tracker.record(elapsed)
+            recorded = True
+
+    def launch(name, factory):
+        started[name] = time.monotonic()
+        task = asyncio.ensure_future(factory())
+        task.hedge_name = name
+        return task
+
+    pending = {launch("primary", primary)}
+    backup_started = False
+    last_error = None
+    invalid = None
+    loop_deadline = time.monotonic() + deadline
+    while pending:
+        timeout = None if backup_started else max(0.0, loop_deadline - time.monotonic())
+        done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            error = task.exception()
+            if error is None and task.hedge_name == "primary":
+                record_primary(time.monotonic() - started["primary"])
+            if error is None and validate(task.result()):
+                for loser in pending:
+                    loser.cancel()
+                    if loser.hedge_name == "primary":
+                        # Censored sample: the primary would have taken at least this long
+                        record_primary(max(time.monotonic() - started["primary"], deadline))
+                return task.result(), task.hedge_name
+            if error is None:
+                invalid = (task.result(), task.hedge_name)
+            else:
+                last_error = error
+        if not backup_started and (not done or not pending):
+            # Primary is past its deadline (or already failed): fire the hedge
+            pending.add(launch("backup", backup))
+            backup_started = True
+    if invalid is not None:
+        return invalid
+    raise last_error
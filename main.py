@@ -1,12 +1,21 @@
 # main.py (updated)
 from scene import Scene
-from story_fetcher import get_groq_story
+from story_fetcher import fallback_story, fetch_story_async, stream_groq_story, warm_story
+from story_pool import StoryPool
 from story_window import StoryWindow
 from animation_controller import AnimationController
 from resource_bank import ResourceBank
+from transform_loading import LoadingView
+from audio_probe import get_audio_backend
+from settings import STORY_POOL_SIZE, STORY_STREAMING
+import queue
 import random
+import threading
 import arcade
-import subprocess  # Added this import
+import pyglet
+
+_loading_view = None  # Built once; its shaders are compiled in the constructor
+_story_poll = None    # Clock callback waiting on the latest story request
 
 def generate_scene(story, instructions):
     """Create a scene using resources from ResourceBank"""
@@ -19,14 +28,133 @@ def generate_scene(story, instructions):
         }
     )
 
+def start_story(window, story, instructions, music_instructions):
+    """Swap from the loading screen to the generated story scene.
+
+    The story's sounds must already be warmed (see warm_story); this runs on
+    the frame thread.
+    """
+    print("Generated Story:")
+    for line in story:
+        print(line)
+    
+    print("\nAnimation Instructions:")
+    for cmd in instructions:
+        print(cmd)
+    
+    print("\nMusic Instructions:")
+    for cmd in music_instructions:
+        print(cmd)
+    
+    scene = generate_scene(story, instructions)
+    window.load_scene(scene)
+    window.animation_controller = AnimationController(window.hero, window.villain, sfx=window.sfx)
+    window.animation_instructions = instructions
+    window.load_music(music_instructions)
+    window.current_instruction_index = 0
+    window.instruction_timer = 0
+    window.hide_view()
+
+def show_loading(window):
+    """Show the loading screen in place of the current scene, reusing the one LoadingView"""
+    global _loading_view
+    window.unload_scene()
+    if _loading_view is None:
+        _loading_view = LoadingView()
+    if window.current_view is not _loading_view:
+        window.show_view(_loading_view)
+
+def wait_for_story(window, future):
+    """Poll the background fetch on the pyglet clock and start the scene when it lands.
+
+    A newer request (e.g. N pressed again) replaces the one being waited on.
+    """
+    global _story_poll
+    if _story_poll is not None:
+        pyglet.clock.unschedule(_story_poll)
+    if not future.done():
+        show_loading(window)
+
+    def poll(delta_time):
+        global _story_poll
+        if not future.done():
+            return
+        pyglet.clock.unschedule(poll)
+        _story_poll = None
+        try:
+            start_story(window, *future.result())
+        except Exception as e:
+            print(f"Error in main execution: {e}")
+            window.cleanup()
+            window.close()
+    _story_poll = poll
+    pyglet.clock.schedule_interval(poll, 0.05)
+
+def stream_story(window):
+    """Start the scene on the first streamed dialogue line and feed in the rest as it arrives"""
+    show_loading(window)
+    events = queue.SimpleQueue()
+
+    def produce():
+        # Sounds are warmed here, before an element reaches the frame thread
+        has_dialogue = False
+        try:
+            for event in stream_groq_story():
+                section, element = event
+                if section == "instructions":
+                    ResourceBank.warm_up([element], [])
+                elif section == "music":
+                    ResourceBank.warm_up([], [element])
+                else:
+                    has_dialogue = True
+                events.put(event)
+        except Exception as e:
+            print(f"API Error: {e}")
+        if not has_dialogue:
+            events.put(("fallback", warm_story(fallback_story())))
+        events.put(None)
+
+    threading.Thread(target=produce, name="story-stream", daemon=True).start()
+    pending = {"dialogue": [], "instructions": [], "music": []}
+
+    def poll(delta_time):
+        finished = False
+        while True:
+            try:
+                event = events.get_nowait()
+            except queue.Empty:
+                break
+            if event is None:
+                finished = True
+                break
+            section, element = event
+            if section == "fallback":
+                if window.scene is None:
+                    print("Streaming produced no dialogue, using the default story")
+                    start_story(window, *element)
+            elif window.scene is None:
+                pending[section].append(element)
+            elif section == "dialogue":
+                window.append_dialogue(element)
+            elif section == "instructions":
+                window.animation_instructions.append(element)
+            else:
+                window.music.add(element)
+
+        if window.scene is None and pending["dialogue"]:
+            start_story(window, pending["dialogue"], pending["instructions"], pending["music"])
+            window.dialogue_complete = False  # Hold on the last line until the stream ends
+        if finished:
+            window.dialogue_complete = True
+            pyglet.clock.unschedule(poll)
+
+    pyglet.clock.schedule_interval(poll, 0.02)
+
 if __name__ == "__main__":
-    try:
-        # Check audio dependencies first
-        subprocess.run(["ffplay", "-h"], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    except FileNotFoundError:
-        print("Error: ffplay not found. Please install ffmpeg package.")
-        input("Press Enter to exit...")
-        exit(1)
+    # Check audio dependencies first (probed once, cached per host)
+    audio_backend = get_audio_backend()
+    if not audio_backend["backend"]:
+        print("Warning: no working audio output found (pyglet or ffplay). Dialogue will be silent.")
 
     # Check if music files exist
     if hasattr(ResourceBank, 'MUSIC'):
@@ -35,28 +163,17 @@ if __name__ == "__main__":
                 print(f"Warning: Music track '{track}' not found at {path}")
 
     try:  # Main execution block starts here
-        # Generate dynamic story and matching animations
-        story, instructions, music_instructions = get_groq_story()
-        
-        print("Generated Story:")
-        for line in story:
-            print(line)
-        
-        print("\nAnimation Instructions:")
-        for cmd in instructions:
-            print(cmd)
-        
-        print("\nMusic Instructions:")
-        for cmd in music_instructions:
-            print(cmd)
-        
-        scene = generate_scene(story, instructions)
-        window = StoryWindow(scene)
-        window.animation_controller = AnimationController(window.hero, window.villain)
-        window.animation_instructions = instructions
-        window.music_instructions = music_instructions
-        window.current_instruction_index = 0
-        window.instruction_timer = 0
+        # Open the window right away and generate the story in the background
+        window = StoryWindow()
+        if STORY_POOL_SIZE > 0:
+            # Kiosk mode: keep stories ready so N starts the next one instantly
+            pool = StoryPool()
+            window.on_next_story = lambda: wait_for_story(window, pool.next_story_async())
+            wait_for_story(window, pool.next_story_async())
+        elif STORY_STREAMING:
+            stream_story(window)
+        else:
+            wait_for_story(window, fetch_story_async())
         
         arcade.run()
         
@@ -64,4 +181,4 @@ if __name__ == "__main__":
         print(f"Error in main execution: {e}")
         if 'window' in locals():
             window.cleanup()
-        input("Press Enter to exit...")
\ No newline at end of file
+        input("Press Enter to exit...")
@@ -0,0 +1,405 @@
+# mixer.py
+import threading
+from collections import deque
+import pyglet
+from pyglet.media.codecs.base import AudioData, AudioFormat
+from pyglet.media.drivers.base import AbstractAudioPlayer
+from audio_player import parse_wav_header
+from settings import (AUDIO_MIXER, MIXER_BLOCK_FRAMES, MIXER_BUS_GAINS, MIXER_DUCK_GAIN,
+                      MIXER_DUCK_SECONDS, MIXER_OUTPUT_BUFFER_BLOCKS, MIXER_SAMPLE_RATE)
+
+try:
+    import numpy as np
+except ImportError:  # The mixer is opt-in; without numpy every sound gets its own player
+    np = None
+
+_mixer = None
+_lock = threading.Lock()
+
+
+def pcm_to_float(data, audio_format, sample_rate=MIXER_SAMPLE_RATE):
+    """Interleaved 8/16-bit PCM bytes -> float32 stereo array (frames, 2) at sample_rate"""
+    if audio_format.sample_size == 8:
+        samples = (np.frombuffer(data, dtype=np.uint8).astype(np.float32) - 128) / 128
+    else:
+        usable = len(data) - len(data) % 2
+        samples = np.frombuffer(data[:usable], dtype="<i2").astype(np.float32) / 32768
+    channels = audio_format.channels
+    samples = samples[:len(samples) - len(samples) % channels].reshape(-1, channels)
+    if channels == 1:
+        samples = np.repeat(samples, 2, axis=1)
+    elif channels > 2:
+        samples = samples[:, :2]
+    if audio_format.sample_rate != sample_rate and len(samples):
+        # Linear resampling is plenty for speech and game audio
+        count = int(round(len(samples) * sample_rate / audio_format.sample_rate))
+        positions = np.linspace(0, len(samples) - 1, count)
+        indices = np.arange(len(samples))
+        samples = np.stack([np.interp(positions, indices, samples[:, c]) for c in range(2)], axis=1)
+    return samples.astype(np.float32, copy=False)
+
+
+class Channel:
+    """One sound on a mixer bus. volume may be changed from any thread.
+
+    ended is set once the mixer has rendered the last sample; finished (and
+    so wait()) only once the output player has actually played it.
+    """
+
+    def __init__(self, volume=1.0):
+        self.volume = volume
+        self.duration = None  # Seconds, when known up front
+        self.ended = False
+        self.finished = threading.Event()
+
+    @property
+    def playing(self):
+        return not self.finished.is_set()
+
+    def stop(self):
+        self.finished.set()
+
+    def terminate(self):
+        """Alias of stop() so a channel can stand in for other playback objects"""
+        self.stop()
+
+    def wait(self, timeout=None):
+        """Block until the sound ends or is stopped"""
+        self.finished.wait(timeout)
+
+    def read(self, frames):
+        """Up to frames of float32 stereo samples; fewer means the sound has ended"""
+        raise NotImplementedError
+
+
+class BufferChannel(Channel):
+    """A fully decoded sound, optionally looping"""
+
+    def __init__(self, samples, volume=1.0, loop=False):
+        super().__init__(volume)
+        self.samples = samples
+        self.loop = loop
+        self.position = 0
+
+    def read(self, frames):
+        if self.loop and len(self.samples):
+            indices = (self.position + np.arange(frames)) % len(self.samples)
+            self.position = int(indices[-1] + 1) % len(self.samples)
+            return self.samples[indices]
+        block = self.samples[self.position:self.position + frames]
+        self.position += len(block)
+        return block
+
+
+class SourceChannel(Channel):
+    """A pyglet source (e.g. a streaming music track) decoded block by block"""
+
+    def __init__(self, source, volume=1.0, loop=False):
+        super().__init__(volume)
+        self.source = source
+        self.loop = loop
+        self._pending = np.zeros((0, 2), dtype=np.float32)
+        self._rewind = True  # Seek on the mixing thread, which owns the source from here on
+
+    def read(self, frames):
+        if self._rewind:
+            self.source.seek(0.0)
+            self._rewind = False
+        blocks, have = [self._pending], len(self._pending)
+        while have < frames:
+            audio_data = self.source.get_audio_data(frames * self.source.audio_format.bytes_per_frame)
+            if audio_data is None:
+                if not self.loop:
+                    break
+                self.source.seek(0.0)
+                continue
+            block = pcm_to_float(audio_data.data, self.source.audio_format)
+            blocks.append(block)
+            have += len(block)
+        samples = np.concatenate(blocks)
+        self._pending = samples[frames:]
+        return samples[:frames]
+
+
+class StreamChannel(Channel):
+    """WAV bytes fed from another thread as they arrive (streamed speech).
+
+    Underruns play silence rather than ending the sound; it ends once
+    finish() was called and everything fed has been played.
+    """
+
+    def __init__(self, volume=1.0):
+        super().__init__(volume)
+        self.audio_format = None
+        self.duration = 0.0  # Seconds fed so far
+        self._header = bytearray()
+        self._partial = b""  # Bytes of a frame split across chunks
+        self._remaining = None
+        self._blocks = deque()
+        self._offset = 0  # Frames of the first block already played
+        self._done = False
+        self._buffer_lock = threading.Lock()
+
+    def feed(self, chunk):
+        """Append bytes from the network; returns True once the format is known"""
+        with self._buffer_lock:
+            if self.audio_format is None:
+                self._header += chunk
+                parsed = parse_wav_header(bytes(self._header))
+                if parsed is None:
+                    return False
+                self.audio_format, header_length, self._remaining = parsed
+                chunk = bytes(self._header[header_length:])
+                self._header = bytearray()
+            if self._remaining is not None:
+                chunk = chunk[:self._remaining]
+                self._remaining -= len(chunk)
+            chunk = self._partial + chunk
+            frame = self.audio_format.bytes_per_frame
+            usable = len(chunk) - len(chunk) % frame
+            self._partial = chunk[usable:]
+            if usable:
+                self._blocks.append(pcm_to_float(chunk[:usable], self.audio_format))
+                self.duration += usable / self.audio_format.bytes_per_second
+            return True
+
+    def finish(self):
+        """Mark the stream complete"""
+        with self._buffer_lock:
+            self._done = True
+
+    def read(self, frames):
+        with self._buffer_lock:
+            parts, have = [], 0
+            while have < frames and self._blocks:
+                head = self._blocks[0]
+                part = head[self._offset:self._offset + frames - have]
+                parts.append(part)
+                have += len(part)
+                self._offset += len(part)
+                if self._offset >= len(head):
+                    self._blocks.popleft()
+                    self._offset = 0
+            if have < frames and not self._done:
+                parts.append(np.zeros((frames - have, 2), dtype=np.float32))
+            if not parts:
+                return np.zeros((0, 2), dtype=np.float32)
+            return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+
+class MixerSource(pyglet.media.StreamingSource):
+    """Endless pyglet source that pulls mixed blocks from the Mixer"""
+
+    def __init__(self, mixer):
+        self.mixer = mixer
+        self.audio_format = AudioFormat(channels=2, sample_size=16, sample_rate=mixer.sample_rate)
+        self.video_format = None
+        self._duration = None
+        self._timestamp = 0.0
+
+    @property
+    def timestamp(self):
+        """Source time of the next block to be rendered"""
+        return self._timestamp
+
+    def get_audio_data(self, num_bytes, compensation_time=0.0):
+        frames = max(1, min(num_bytes // self.audio_format.bytes_per_frame, self.mixer.block_frames))
+        data = self.mixer.render(frames)
+        duration = frames / self.mixer.sample_rate
+        audio_data = AudioData(data, len(data), timestamp=self._timestamp, duration=duration)
+        self._timestamp += duration
+        return audio_data
+
+    def seek(self, timestamp):
+        pass
+
+
+class Mixer:
+    """Sums music, SFX and voice buses in NumPy and plays the result on one pyglet player.
+
+    Each bus has a gain (MIXER_BUS_GAINS). While anything is playing on the
+    voice bus, the music bus is ducked to MIXER_DUCK_GAIN, ramping over
+    MIXER_DUCK_SECONDS so the change isn't audible as a click.
+    """
+
+    BUSES = ("music", "sfx", "voice")
+
+    def __init__(self, sample_rate=MIXER_SAMPLE_RATE, block_frames=MIXER_BLOCK_FRAMES, gains=None,
+                 duck_gain=MIXER_DUCK_GAIN, duck_seconds=MIXER_DUCK_SECONDS):
+        self.sample_rate = sample_rate
+        self.block_frames = block_frames
+        self.gains = dict(MIXER_BUS_GAINS if gains is None else gains)
+        self.duck_gain = duck_gain
+        self.duck_seconds = duck_seconds
+        self.source = MixerSource(self)
+        self.player = None
+        self._duck = 1.0
+        self._channels = {bus: [] for bus in self.BUSES}
+        self._decoded = {}  # static pyglet source -> samples, decoded once
+        self._completing = []  # (source timestamp of last sample, channel) not yet heard
+        self._lock = threading.Lock()
+
+    def start(self, delta_time=0):
+        """Start the output player; runs on the pyglet clock.
+
+        pyglet buffers AbstractAudioPlayer.audio_buffer_length (0.9 s) of
+        source data ahead, which would delay every cue, duck and line by
+        that much. The mixer's player is created with a buffer of
+        MIXER_OUTPUT_BUFFER_BLOCKS blocks instead (pyglet's floor is 32 KB).
+        """
+        if self.player is None:
+            default_length = AbstractAudioPlayer.audio_buffer_length
+            AbstractAudioPlayer.audio_buffer_length = (
+                MIXER_OUTPUT_BUFFER_BLOCKS * self.block_frames / self.sample_rate)
+            try:
+                self.player = pyglet.media.Player()
+                self.player.queue(self.source)
+                self.player.play()  # Creates the driver audio player with the buffer size above
+            finally:
+                AbstractAudioPlayer.audio_buffer_length = default_length
+
+    def play(self, bus, source, volume=1.0, loop=False):
+        """Play a pyglet source on a bus, returning its Channel.
+
+        Static sources are decoded into memory once and reused; streaming
+        sources are read block by block.
+        """
+        if isinstance(source, pyglet.media.StaticSource):
+            channel = BufferChannel(self._samples(source), volume, loop)
+        else:
+            channel = SourceChannel(source, volume, loop)
+        return self._add(bus, channel)
+
+    def preload(self, source):
+        """Decode a static source now, off the frame thread, so play() finds its samples ready"""
+        if isinstance(source, pyglet.media.StaticSource):
+            self._samples(source)
+
+    def play_wav(self, bus, audio_data, volume=1.0):
+        """Play complete WAV bytes (e.g. a synthesized line) on a bus"""
+        audio_format, header_length, data_size = parse_wav_header(audio_data)
+        end = header_length + data_size if data_size is not None else len(audio_data)
+        samples = pcm_to_float(audio_data[header_length:end], audio_format, self.sample_rate)
+        channel = self._add(bus, BufferChannel(samples, volume))
+        channel.duration = len(samples) / self.sample_rate
+        return channel
+
+    def open_stream(self, bus, volume=1.0):
+        """A StreamChannel on a bus to feed WAV bytes into as they arrive"""
+        return self._add(bus, StreamChannel(volume))
+
+    def stop(self):
+        """Stop every channel and the output player"""
+        with self._lock:
+            for channels in self._channels.values():
+                for channel in channels:
+                    channel.stop()
+                channels.clear()
+            for _, channel in self._completing:
+                channel.stop()
+            self._completing.clear()
+        if self.player is not None:
+            self.player.pause()
+            self.player.delete()
+            self.player = None
+
+    def render(self, frames):
+        """Mix the next block of frames into 16-bit stereo PCM bytes"""
+        self._signal_heard()
+        block_start = self.source.timestamp
+        with self._lock:
+            buses = {bus: list(channels) for bus, channels in self._channels.items()}
+        mixed = np.zeros((frames, 2), dtype=np.float32)
+        ended = []
+        duck = self._duck_ramp(frames, any(not channel.ended and channel.playing for channel in buses["voice"]))
+        for bus, channels in buses.items():
+            if not channels:
+                continue
+            bus_mix = np.zeros((frames, 2), dtype=np.float32)
+            for channel in channels:
+                if not channel.playing:
+                    ended.append((bus, channel))
+                    continue
+                block = channel.read(frames)
+                bus_mix[:len(block)] += block * channel.volume
+                if len(block) < frames:
+                    # Rendered to the end; it is finished once the player reaches this point
+                    channel.ended = True
+                    ended.append((bus, channel))
+                    with self._lock:
+                        self._completing.append((block_start + len(block) / self.sample_rate, channel))
+            if bus == "music":
+                bus_mix *= duck[:, None]
+            mixed += bus_mix * self.gains.get(bus, 1.0)
+        if ended:
+            with self._lock:
+                for bus, channel in ended:
+                    if channel in self._channels[bus]:
+                        self._channels[bus].remove(channel)
+        np.clip(mixed, -1.0, 1.0, out=mixed)
+        return (mixed * 32767).astype("<i2").tobytes()
+
+    def _signal_heard(self):
+        """Set finished on channels whose last sample the output player has played"""
+        if not self._completing:
+            return
+        heard = self.player.time if self.player is not None else float("inf")
+        with self._lock:
+            still_buffered = []
+            for end, channel in self._completing:
+                if end <= heard:
+                    channel.finished.set()
+                else:
+                    still_buffered.append((end, channel))
+            self._completing = still_buffered
+
+    def _duck_ramp(self, frames, ducked):
+        """Per-frame music gain moving toward the duck target"""
+        target = self.duck_gain if ducked else 1.0
+        step = frames / (self.sample_rate * self.duck_seconds) if self.duck_seconds > 0 else 1.0
+        start = self._duck
+        if target < start:
+            end = max(target, start - step)
+        else:
+            end = min(target, start + step)
+        self._duck = end
+        return np.linspace(start, end, frames, dtype=np.float32)
+
+    def _add(self, bus, channel):
+        if bus not in self._channels:
+            raise ValueError(f"Unknown mixer bus '{bus}', expected one of {self.BUSES}")
+        with self._lock:
+            self._channels[bus].append(channel)
+        return channel
+
+    def _samples(self, source):
+        with self._lock:
+            samples = self._decoded.get(source)
+        if samples is None:
+            reader = source.get_queue_source()
+            chunks = []
+            while True:
+                audio_data = reader.get_audio_data(1 << 20)
+                if audio_data is None:
+                    break
+                chunks.append(audio_data.data)
+            samples = pcm_to_float(b"".join(chunks), source.audio_format, self.sample_rate)
+            with self._lock:
+                self._decoded[source] = samples
+        return samples
+
+
+def get_mixer():
+    """The process-wide Mixer when AUDIO_MIXER is on and numpy is available, else None"""
+    global _mixer
+    if not AUDIO_MIXER:
+        return None
+    with _lock:
+        if _mixer is None:
+            if np is None:
+                print("AUDIO_MIXER is on but numpy is not installed; using separate players")
+                return None
+            _mixer = Mixer()
+            # The output player is created on the frame thread
+            pyglet.clock.schedule_once(_mixer.start, 0)
+        return _mixer
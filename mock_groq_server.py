@@ -0,0 +1,326 @@
+# mock_groq_server.py
+"""
+Local stand-in for the Groq API, for load tests and benchmarks without a key.
+
+Serves the endpoints the project uses under the same paths as Groq:
+
+    POST /openai/v1/chat/completions   (JSON or SSE with "stream": true)
+    POST /openai/v1/audio/speech       (WAV, sent in chunks)
+    GET  /stats                        (request, status and connection counters)
+
+Stories come from the offline TemplateBackend and speech is a quiet tone
+whose length follows the text, so every payload is valid for the real
+parsers. Latency, 5xx errors, 429s (with Retry-After) and truncated
+payloads are injected from a seeded RNG, so a run is reproducible.
+
+    python mock_groq_server.py --port 8765 --latency lognormal --latency-mean 0.8 --rate-limit-rate 0.1
+    GROQ_BASE_URL=http://127.0.0.1:8765 GROQ_API_KEY=mock python main.py
+"""
+import argparse
+import io
+import json
+import math
+import random
+import struct
+import sys
+import threading
+import time
+import uuid
+import wave
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from rate_limiter import TokenBucket
+from story_backends import TemplateBackend
+
+SPEECH_SAMPLE_RATE = 24000
+SPEECH_WORDS_PER_SECOND = 2.5
+
+
+class FaultProfile:
+    """Latency distribution and failure rates applied to every request"""
+
+    def __init__(self, latency="fixed", latency_mean=0.3, latency_jitter=0.1, error_rate=0.0,
+                 rate_limit_rate=0.0, retry_after=1.0, truncate_rate=0.0, seed=0):
+        self.latency = latency
+        self.latency_mean = latency_mean
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.truncate_rate = truncate_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self):
+        """Seconds to wait before the first byte of a response"""
+        with self._lock:
+            if self.latency == "uniform":
+                value = self._rng.uniform(self.latency_mean - self.latency_jitter,
+                                          self.latency_mean + self.latency_jitter)
+            elif self.latency == "lognormal":
+                # Heavy right tail: median ~latency_mean, jitter is the sigma of the log
+                value = self._rng.lognormvariate(math.log(max(self.latency_mean, 1e-6)), self.latency_jitter)
+            elif self.latency == "exponential":
+                value = self._rng.expovariate(1 / self.latency_mean) if self.latency_mean > 0 else 0.0
+            else:
+                value = self.latency_mean
+        return max(0.0, value)
+
+    def roll(self, rate):
+        with self._lock:
+            return self._rng.random() < rate
+
+
+class MockGroqServer(ThreadingHTTPServer):
+    """ThreadingHTTPServer that also keeps the counters behind /stats"""
+
+    daemon_threads = True
+
+    def __init__(self, address, profile, rpm=None, token_delay=0.02, chunk_size=4096, speech_speed=4.0):
+        super().__init__(address, MockGroqHandler)
+        self.profile = profile
+        self.token_delay = token_delay
+        self.chunk_size = chunk_size
+        self.speech_speed = speech_speed  # Speech is sent this many times faster than real time
+        self.story_backend = TemplateBackend()
+        self._bucket = TokenBucket(rpm) if rpm else None
+        self._lock = threading.Lock()
+        self.counters = Counter()
+
+    def count(self, key, amount=1):
+        with self._lock:
+            self.counters[key] += amount
+
+    def admit(self):
+        """Server-side requests-per-minute limit; returns Retry-After seconds or 0"""
+        if self._bucket is None:
+            return 0.0
+        with self._lock:
+            wait = self._bucket.reserve(1)
+            if wait:
+                self._bucket.tokens += 1  # Rejected requests don't consume quota
+            return wait
+
+    def handle_error(self, request, client_address):
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            self.count("disconnects")  # Client hung up, e.g. a cancelled hedge
+            return
+        super().handle_error(request, client_address)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        requests = stats.get("requests", 0)
+        connections = stats.get("connections", 0)
+        stats["requests_per_connection"] = round(requests / connections, 2) if connections else 0.0
+        return stats
+
+
+class MockGroqHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, so client connection reuse is visible in /stats
+
+    def setup(self):
+        super().setup()
+        self.server.count("connections")
+
+    def log_message(self, format, *args):
+        pass  # Keep load tests quiet; see /stats instead
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/stats":
+            self._send_json(200, self.server.stats())
+        else:
+            self._send_error(404, "not_found", f"Unknown path {self.path}")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_error(400, "invalid_request_error", "Request body is not valid JSON")
+            return
+        route = {
+            "/openai/v1/chat/completions": self._chat,
+            "/openai/v1/audio/speech": self._speech
+        }.get(self.path.rstrip("/"))
+        if route is None:
+            self._send_error(404, "not_found", f"Unknown path {self.path}")
+            return
+        self.server.count("requests")
+        if self._inject_failure():
+            return
+        route(body)
+
+    def _inject_failure(self):
+        """Apply latency, server-side RPM and random failures; True if a failure was sent"""
+        profile = self.server.profile
+        time.sleep(profile.delay())
+        wait = self.server.admit()
+        if wait or profile.roll(profile.rate_limit_rate):
+            retry_after = max(wait, profile.retry_after)
+            self._send_error(429, "rate_limit_exceeded", "Rate limit reached, please try again later",
+                             headers={"Retry-After": f"{retry_after:.2f}"})
+            return True
+        if profile.roll(profile.error_rate):
+            self._send_error(500, "internal_server_error", "Injected server error")
+            return True
+        return False
+
+    def _chat(self, body):
+        messages = body.get("messages") or []
+        max_tokens = body.get("max_tokens") or 500
+        content = self.server.story_backend.complete(messages, max_tokens, body.get("temperature", 0.7))
+        truncated = self.server.profile.roll(self.server.profile.truncate_rate)
+        if truncated:
+            content = content[:max(1, len(content) * 2 // 3)]
+            self.server.count("truncated")
+        prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 4
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(content) // 4,
+            "total_tokens": prompt_tokens + len(content) // 4
+        }
+        model = body.get("model", "mock")
+        if body.get("stream") and body.get("response_format", {}).get("type") == "json_object":
+            # Like Groq: JSON mode can't be combined with streaming
+            self._send_error(400, "invalid_request_error", "`response_format` does not support streaming")
+        elif body.get("stream"):
+            self._stream_chat(content, model, "length" if truncated else "stop")
+        elif truncated and body.get("response_format", {}).get("type") == "json_object":
+            # What Groq sends when JSON mode output is cut off
+            self._send_error(400, "invalid_request_error", "Failed to generate JSON",
+                             code="json_validate_failed", failed_generation=content)
+        else:
+            self._send_json(200, {
+                "id": f"chatcmpl-{uuid.uuid4().hex}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "length" if truncated else "stop"
+                }],
+                "usage": usage
+            })
+
+    def _stream_chat(self, content, model, finish_reason):
+        self._start_chunked(200, "text/event-stream")
+        chunk_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+        def event(delta, finish=None):
+            payload = {
+                "id": chunk_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]
+            }
+            self._write_chunk(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+
+        event({"role": "assistant", "content": ""})
+        for start in range(0, len(content), 16):  # ~4 tokens per event
+            if self.server.token_delay:
+                time.sleep(self.server.token_delay)
+            event({"content": content[start:start + 16]})
+        event({}, finish_reason)
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._end_chunked()
+
+    def _speech(self, body):
+        audio = speech_wav(body.get("input", ""))
+        if self.server.profile.roll(self.server.profile.truncate_rate):
+            audio = audio[:max(44, len(audio) // 2)]  # Header claims more frames than are sent
+            self.server.count("truncated")
+        self._start_chunked(200, "audio/wav")
+        seconds_per_byte = 1 / (SPEECH_SAMPLE_RATE * 2)
+        for start in range(0, len(audio), self.server.chunk_size):
+            chunk = audio[start:start + self.server.chunk_size]
+            self._write_chunk(chunk)
+            if self.server.token_delay and self.server.speech_speed:
+                # Generate a little faster than real time, like a streaming TTS service
+                time.sleep(len(chunk) * seconds_per_byte / self.server.speech_speed)
+        self._end_chunked()
+
+    def _start_chunked(self, status, content_type):
+        self.server.count(f"status_{status}")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _end_chunked(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.server.count(f"status_{status}")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_error(self, status, error_type, message, headers=None, **extra):
+        error = {"message": message, "type": error_type, **extra}
+        self._send_json(status, {"error": error}, headers)
+
+
+def speech_wav(text):
+    """16-bit mono WAV of a quiet tone lasting as long as the text would take to say"""
+    seconds = max(0.5, len(text.split()) / SPEECH_WORDS_PER_SECOND)
+    frames = int(seconds * SPEECH_SAMPLE_RATE)
+    samples = (int(2000 * math.sin(2 * math.pi * 220 * i / SPEECH_SAMPLE_RATE)) for i in range(frames))
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SPEECH_SAMPLE_RATE)
+        wav.writeframes(struct.pack(f"<{frames}h", *samples))
+    return buffer.getvalue()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local mock of the Groq chat and speech API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=0, help="Seed for latency and failure injection")
+    parser.add_argument("--latency", choices=["fixed", "uniform", "lognormal", "exponential"], default="fixed")
+    parser.add_argument("--latency-mean", type=float, default=0.3, help="Seconds before the first byte")
+    parser.add_argument("--latency-jitter", type=float, default=0.1,
+                        help="Half-width for uniform, log sigma for lognormal")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--truncate-rate", type=float, default=0.0, help="Fraction of payloads cut short")
+    parser.add_argument("--rpm", type=int, default=None, help="Server-enforced requests per minute")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="Seconds between streamed chat events")
+    parser.add_argument("--chunk-size", type=int, default=4096, help="Bytes per streamed speech chunk")
+    parser.add_argument("--speech-speed", type=float, default=4.0,
+                        help="Speech delivery speed as a multiple of real time (below 1 trickles)")
+    args = parser.parse_args(argv)
+
+    profile = FaultProfile(args.latency, args.latency_mean, args.latency_jitter, args.error_rate,
+                           args.rate_limit_rate, args.retry_after, args.truncate_rate, args.seed)
+    server = MockGroqServer((args.host, args.port), profile, args.rpm, args.token_delay, args.chunk_size,
+                            args.speech_speed)
+    print(f"Mock Groq API on http://{args.host}:{args.port} (set GROQ_BASE_URL to this)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(server.stats(), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,140 @@
+# music_cues.py
+from mixer import Channel, get_mixer
+from resource_bank import ResourceBank
+from settings import MUSIC_CROSSFADE_SECONDS, MUSIC_VOLUME
+
+
+class MusicCue:
+    """One music instruction anchored to a dialogue line or a scene timestamp"""
+
+    def __init__(self, action, track=None, line=None, at=None):
+        self.action = action
+        self.track = track
+        self.line = line  # Fires when this dialogue line starts
+        self.at = at      # Or this many seconds after the scene started
+        self.fired = False
+
+    def due(self, elapsed, current_line):
+        if self.at is not None:
+            return elapsed >= self.at
+        return current_line >= self.line
+
+
+class MusicScheduler:
+    """Fires each music cue once and crossfades between tracks.
+
+    Cues come from the story's music instructions. One explicitly anchored
+    with "line" or "at" keeps its anchor; otherwise the first cue plays at
+    scene start and later ones are spread across the dialogue. Tracks come
+    from ResourceBank's music cache, which the story fetch warms off the
+    frame thread, so firing a cue only starts a player; a released track is
+    rewound by the next warm-up, not here. update() does nothing between
+    cues and fades.
+    """
+
+    def __init__(self, volume=MUSIC_VOLUME, crossfade=MUSIC_CROSSFADE_SECONDS):
+        self.volume = volume
+        self.crossfade = crossfade
+        self.cues = []
+        self.elapsed = 0.0
+        self.line_spacing = 1  # Dialogue lines between unanchored cues
+        self.current_track = None
+        self._players = {}  # track -> pyglet Player (or mixer Channel) currently audible
+        self._fades = {}    # track -> volume change per second (+ fading in, - fading out)
+
+    def load(self, instructions, line_count):
+        """Replace the cues with a new scene's music instructions"""
+        self.stop()
+        self.cues = []
+        self.elapsed = 0.0
+        self.line_spacing = max(1, line_count // max(1, len(instructions)))
+        for instruction in instructions:
+            self.add(instruction)
+
+    def add(self, instruction):
+        """Add one music instruction (e.g. streamed in after the scene started)"""
+        index = len(self.cues)
+        line, at = instruction.get("line"), instruction.get("at")
+        if line is None and at is None:
+            if index == 0:
+                at = 0.0
+            else:
+                line = index * self.line_spacing
+        cue = MusicCue(instruction.get("action", "play"), instruction.get("track"), line, at)
+        self.cues.append(cue)
+
+    def update(self, delta_time, current_line):
+        """Fire due cues and advance crossfades; call once per frame"""
+        self.elapsed += delta_time
+        for cue in self.cues:
+            if not cue.fired and cue.due(self.elapsed, current_line):
+                cue.fired = True
+                self._fire(cue)
+        if self._fades:
+            self._step_fades(delta_time)
+
+    def stop(self):
+        """Stop all music immediately"""
+        for track in list(self._players):
+            self._release(track)
+        self._fades.clear()
+        self.current_track = None
+
+    def _fire(self, cue):
+        if cue.action == "stop":
+            self._fade_out_all()
+            self.current_track = None
+        elif cue.action == "play" and cue.track and cue.track != self.current_track:
+            self._fade_out_all()
+            self._start(cue.track)
+
+    def _start(self, track):
+        sound = ResourceBank.get_music(track)
+        if sound is None:
+            return
+        player = self._players.get(track)
+        if player is None:
+            try:
+                mixer = get_mixer()
+                if mixer is not None:
+                    player = mixer.play("music", sound.source, volume=0.0, loop=True)
+                else:
+                    player = sound.play(volume=0.0, loop=True)
+            except Exception as e:
+                print(f"Error playing music '{track}': {e}")
+                return
+            self._players[track] = player
+        # Fade in from wherever it is (a track fading out is simply turned back up)
+        self._fades[track] = self._fade_rate()
+        self.current_track = track
+
+    def _fade_out_all(self):
+        for track in self._players:
+            self._fades[track] = -self._fade_rate()
+
+    def _fade_rate(self):
+        return self.volume / self.crossfade if self.crossfade > 0 else float("inf")
+
+    def _step_fades(self, delta_time):
+        for track, rate in list(self._fades.items()):
+            player = self._players.get(track)
+            if player is None:
+                del self._fades[track]
+                continue
+            volume = min(self.volume, max(0.0, player.volume + rate * delta_time))
+            player.volume = volume
+            if rate < 0 and volume <= 0.0:
+                self._release(track)
+                self._fades.pop(track, None)
+            elif rate > 0 and volume >= self.volume:
+                del self._fades[track]
+
+    def _release(self, track):
+        player = self._players.pop(track, None)
+        if isinstance(player, Channel):
+            player.stop()
+        elif player is not None:
+            try:
+                ResourceBank.release_music(track, player)
+            except Exception as e:
+                print(f"Error stopping music: {e}")
@@ -0,0 +1,167 @@
+# rate_limiter.py
+import asyncio
+import email.utils
+import random
+import threading
+import time
+import groq
+from settings import (GROQ_CHAT_RPM, GROQ_CHAT_TPM, GROQ_MAX_RETRIES, GROQ_RETRY_BASE_DELAY,
+                      GROQ_RETRY_MAX_DELAY, GROQ_SPEECH_RPM, GROQ_SPEECH_TPM)
+
+# Errors worth waiting out: rate limits, server errors and dropped connections
+RETRYABLE_ERRORS = (groq.RateLimitError, groq.InternalServerError, groq.APIConnectionError)
+
+
+class TokenBucket:
+    """Classic token bucket: capacity tokens, refilled continuously per minute"""
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+
+    def reserve(self, amount):
+        """Take amount tokens (going negative if needed); returns seconds to wait"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        amount = min(amount, self.capacity)
+        self.tokens -= amount
+        return max(0.0, -self.tokens / self.rate)
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute buckets shared by every caller of one endpoint.
+
+    A server push-back (pause) is a deadline every acquire waits for, on top
+    of (not added to) whatever the buckets require.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens, charge):
+        with self._lock:
+            wait = max(0.0, self._paused_until - time.monotonic())
+            if charge and self.requests:
+                wait = max(wait, self.requests.reserve(1))
+            if charge and self.tokens and tokens:
+                wait = max(wait, self.tokens.reserve(tokens))
+            return wait
+
+    def acquire(self, tokens=0, charge=True):
+        """Block until a request costing tokens fits within both limits.
+
+        With charge=False (a retry of a request already charged) only a
+        pause is waited out.
+        """
+        wait = self._reserve(tokens, charge)
+        if wait:
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens=0, charge=True):
+        wait = self._reserve(tokens, charge)
+        if wait:
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds):
+        """Hold back every caller for seconds after the server pushed back"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(endpoint):
+    """Shared limiter for "chat" or "speech", configured from settings"""
+    limits = {
+        "chat": (GROQ_CHAT_RPM, GROQ_CHAT_TPM),
+        "speech": (GROQ_SPEECH_RPM, GROQ_SPEECH_TPM)
+    }
+    with _limiters_lock:
+        if endpoint not in _limiters:
+            _limiters[endpoint] = RateLimiter(*limits[endpoint])
+        return _limiters[endpoint]
+
+
+def set_rate_limits(endpoint, requests_per_minute=None, tokens_per_minute=None):
+    """Replace the shared limiter for an endpoint, e.g. from command-line flags"""
+    with _limiters_lock:
+        _limiters[endpoint] = RateLimiter(requests_per_minute, tokens_per_minute)
+        return _limiters[endpoint]
+
+
+def retry_after(error):
+    """Seconds the server asked us to wait, from Retry-After(-ms) headers, if any"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        date = email.utils.parsedate_to_datetime(value)
+        return max(0.0, date.timestamp() - time.time()) if date else None
+
+
+def backoff_delay(attempt, error=None):
+    """Retry-After if the server sent one, otherwise full-jitter exponential backoff"""
+    server_delay = retry_after(error) if error is not None else None
+    if server_delay is not None:
+        return min(server_delay, GROQ_RETRY_MAX_DELAY)
+    return random.uniform(0, min(GROQ_RETRY_MAX_DELAY, GROQ_RETRY_BASE_DELAY * 2 ** attempt))
+
+
+def call_with_retry(fn, limiter=None, tokens=0, max_retries=GROQ_MAX_RETRIES):
+    """Call fn() under the rate limiter, retrying retryable errors with backoff.
+
+    Quota is charged once per call, not per attempt. A 429 pauses the
+    limiter for every caller and the retry waits that pause out.
+    """
+    for attempt in range(max_retries + 1):
+        if limiter:
+            limiter.acquire(tokens, charge=attempt == 0)
+        try:
+            return fn()
+        except RETRYABLE_ERRORS as e:
+            if attempt == max_retries:
+                raise
+            delay = backoff_delay(attempt, e)
+            print(f"Groq request failed ({e.__class__.__name__}), retrying in {delay:.1f}s")
+            if limiter and isinstance(e, groq.RateLimitError):
+                limiter.pause(delay)
+            else:
+                time.sleep(delay)
+
+
+async def call_with_retry_async(fn, limiter=None, tokens=0, max_retries=GROQ_MAX_RETRIES):
+    """Async version of call_with_retry; fn returns an awaitable"""
+    for attempt in range(max_retries + 1):
+        if limiter:
+            await limiter.acquire_async(tokens, charge=attempt == 0)
+        try:
+            return await fn()
+        except RETRYABLE_ERRORS as e:
+            if attempt == max_retries:
+                raise
+            delay = backoff_delay(attempt, e)
+            print(f"Groq request failed ({e.__class__.__name__}), retrying in {delay:.1f}s")
+            if limiter and isinstance(e, groq.RateLimitError):
+                limiter.pause(delay)
+            else:
+                await asyncio.sleep(delay)
@@ -1,5 +1,7 @@
 import arcade
 import random
+import threading
+from mixer import get_mixer
 
 class ResourceBank:
     # Character sprites
@@ -134,6 +136,17 @@ class ResourceBank:
         "scifi": ":resources:music/funkyrobot.mp3"
     }
 
+    # Sound effects each animation action can trigger
+    ACTION_SOUNDS = {
+        "hurt": ["hurt1", "hit1"]
+    }
+
+    # Decoded sounds, loaded once per process
+    _sound_cache = {}
+    _music_cache = {}
+    _music_played = set()  # Tracks whose stream a player has moved past the start
+    _cache_lock = threading.Lock()
+
     @classmethod
     def get_random_character(cls, role="hero"):
         """Get a random character for the specified role"""
@@ -185,4 +198,64 @@ class ResourceBank:
         """Get a random music track"""
         return random.choice(list(cls.MUSIC.values()))
 
-    
\ No newline at end of file
+    
+
+    @classmethod
+    def get_sound(cls, name):
+        """Sound effect decoded into a static buffer, loaded on first use (None if unknown)"""
+        with cls._cache_lock:
+            sound = cls._sound_cache.get(name)
+            if sound is None and name in cls.SOUNDS:
+                try:
+                    sound = cls._sound_cache[name] = arcade.Sound(cls.SOUNDS[name], streaming=False)
+                except Exception as e:
+                    print(f"Error loading sound '{name}': {e}")
+            return sound
+
+    @classmethod
+    def get_music(cls, track, rewind=False):
+        """Streaming music track, opened once and reused (None if unknown).
+
+        A streaming source can only be on one player at a time and keeps
+        its position; stop it with release_music. rewind=True reopens a
+        released track from the start, which reads the disk, so only
+        warm_up passes it.
+        """
+        with cls._cache_lock:
+            sound = cls._music_cache.get(track)
+            if rewind and track in cls._music_played:
+                sound = None
+            if sound is None and track in cls.MUSIC:
+                try:
+                    sound = cls._music_cache[track] = arcade.Sound(cls.MUSIC[track], streaming=True)
+                    cls._music_played.discard(track)
+                except Exception as e:
+                    print(f"Error loading music '{track}': {e}")
+            return sound
+
+    @classmethod
+    def release_music(cls, track, player):
+        """Stop a player of a music track; the next warm_up rewinds the track"""
+        with cls._cache_lock:
+            sound = cls._music_cache.get(track)
+            cls._music_played.add(track)
+        if sound is not None:
+            sound.stop(player)
+
+    @classmethod
+    def warm_up(cls, instructions=(), music=()):
+        """Preload the sound effects and tracks a story will need.
+
+        Call at scene load so triggering a cue or an action later never
+        reads the disk or opens a decoder on the frame thread. With the
+        mixer on, effects are also converted to its sample format here.
+        """
+        mixer = get_mixer()
+        for instruction in instructions:
+            for name in cls.ACTION_SOUNDS.get(instruction.get("action"), []):
+                sound = cls.get_sound(name)
+                if sound is not None and mixer is not None:
+                    mixer.preload(sound.source)
+        for cue in music:
+            if cue.get("action") == "play" and cue.get("track"):
+                cls.get_music(cue["track"], rewind=True)
@@ -14,4 +14,95 @@ CAMERA_SPEED = 0.1   # Camera follow speed (0-1)
 # Dialogue settings
 FADE_IN_SPEED = 0.02
 FADE_OUT_SPEED = 0.01
-DIALOGUE_DISPLAY_TIME = 180  # frames
\ No newline at end of file
+DIALOGUE_DISPLAY_TIME = 180  # frames
+
+# Dialogue timing (seconds, independent of frame rate)
+DIALOGUE_FADE_IN_SECONDS = 0.8
+DIALOGUE_FADE_OUT_SECONDS = 1.6
+DIALOGUE_MIN_DISPLAY_SECONDS = 1.0
+DIALOGUE_TAIL_SECONDS = 0.4        # Pause after a spoken line before it fades out
+DIALOGUE_WORDS_PER_SECOND = 2.5    # Hold-time estimate when a line isn't spoken
+# TTS audio cache
+TTS_CACHE_DIR = ".cache/tts"
+TTS_CACHE_MAX_BYTES = 200 * 1024 * 1024  # LRU eviction beyond this size
+
+# TTS prefetch
+TTS_PREFETCH_CONCURRENCY = 3  # Parallel synthesis requests at scene load
+TTS_PREFETCH_LOOKAHEAD = 3    # Ready clips kept in memory ahead of the current line
+TTS_PREFETCH_STREAM_AHEAD = 2  # With TTS_STREAMING, the current and next lines are streamed, not prefetched
+
+# TTS playback
+TTS_ENABLED = True
+TTS_VOLUME = 0.5
+TTS_START_TIMEOUT = 5.0  # Seconds to wait for speech to start before falling back to the text estimate
+TTS_AUDIO_DEVICES = ["pulseaudio", "pipewire", "alsa", "jack"]  # ffplay SDL drivers, probed in order; "driver:device" also sets AUDIODEV
+AUDIO_PROBE_CACHE = ".cache/audio_probe.json"  # Set to None to re-probe every run
+TTS_STREAMING = True           # Start playback on the first audio chunk instead of the whole clip
+TTS_STREAM_CHUNK_BYTES = 4096
+
+# Story response cache
+STORY_CACHE_PATH = ".cache/stories.sqlite3"
+STORY_CACHE_TTL_SECONDS = 7 * 24 * 3600
+STORY_CACHE_MAX_BYTES = 20 * 1024 * 1024
+STORY_CACHE_REUSE = False  # Serve cached stories instead of calling the API (or set STORY_CACHE_REUSE=1)
+
+# Shared Groq HTTP client
+GROQ_MAX_CONNECTIONS = 20
+GROQ_MAX_KEEPALIVE_CONNECTIONS = 10
+GROQ_KEEPALIVE_EXPIRY = 60.0  # Seconds an idle connection stays open for reuse
+GROQ_CONNECT_TIMEOUT = 5.0
+GROQ_READ_TIMEOUT = 60.0
+
+# Story prefetch pool (kiosk mode); 0 disables the pool
+STORY_POOL_SIZE = 0
+STORY_POOL_CONCURRENCY = 2
+STORY_POOL_REFILL_RETRIES = 3  # Extra attempts per failed refill, with backoff between them
+
+# Start the scene on the first streamed dialogue line (ignored when the story pool is enabled)
+STORY_STREAMING = True
+
+# Decomposed story generation: dialogue, animation and music as separate, smaller requests
+STORY_DECOMPOSED = False
+STORY_SECTION_MAX_TOKENS = {"dialogue": 300, "instructions": 200, "music": 60}
+
+# Hedged story requests: fire a backup request if the first is slower than usual
+STORY_HEDGE = False
+STORY_HEDGE_MODEL = None              # None hedges with the same model
+STORY_HEDGE_PERCENTILE = 95           # Hedge once the primary exceeds this latency percentile
+STORY_HEDGE_DEFAULT_DEADLINE = 3.0    # Seconds, used until enough latencies are observed
+STORY_HEDGE_MIN_SAMPLES = 10
+STORY_HEDGE_WINDOW = 200              # Recent latencies kept for the percentile
+
+# Client-side rate limits and retries for Groq calls (None disables a bucket)
+GROQ_CHAT_RPM = 30
+GROQ_CHAT_TPM = 6000
+GROQ_SPEECH_RPM = 10
+GROQ_SPEECH_TPM = None
+GROQ_MAX_RETRIES = 5
+GROQ_RETRY_BASE_DELAY = 0.5   # Seconds; doubled per attempt with full jitter
+GROQ_RETRY_MAX_DELAY = 30.0
+
+# Story generation backend: "groq", "openai" (any OpenAI-compatible HTTP server) or "template" (offline)
+STORY_BACKEND = "groq"
+STORY_MODEL = "llama-3.1-8b-instant"
+STORY_HEDGE_BACKEND = "groq"  # Set to "template" to hedge slow API calls with the offline generator
+OPENAI_COMPAT_BASE_URL = "http://localhost:8000/v1"
+OPENAI_COMPAT_MODEL = "local-model"
+
+# Background music
+MUSIC_VOLUME = 0.3              # Leaves room for dialogue
+MUSIC_CROSSFADE_SECONDS = 2.0
+
+# Sound effects
+SFX_MAX_VOICES = 8              # Effects sounding at once; the oldest is cut off beyond this
+SFX_VOLUME = 0.6
+SFX_COOLDOWN_SECONDS = 0.15     # Minimum gap before the same effect plays again
+
+# In-process mixer (needs numpy): music, SFX and speech summed into one output stream
+AUDIO_MIXER = False
+MIXER_SAMPLE_RATE = 44100
+MIXER_BLOCK_FRAMES = 2048        # Frames mixed per block (~46 ms at 44.1 kHz)
+MIXER_BUS_GAINS = {"music": 1.0, "sfx": 1.0, "voice": 1.0}
+MIXER_DUCK_GAIN = 0.35           # Music level while a line is spoken
+MIXER_DUCK_SECONDS = 0.3         # Duck attack/release time
+MIXER_OUTPUT_BUFFER_BLOCKS = 2   # Output buffering in blocks; pyglet keeps at least 32 KB (~0.19 s)
@@ -0,0 +1,124 @@
+# sfx_pool.py
+import random
+import time
+import pyglet
+from mixer import get_mixer
+from resource_bank import ResourceBank
+from settings import SFX_COOLDOWN_SECONDS, SFX_MAX_VOICES, SFX_VOLUME
+
+
+class SFXVoice(pyglet.media.Player):
+    """A Player that stays loaded at end of stream.
+
+    pyglet's default on_eos advances the playlist, and an empty playlist
+    deletes the driver audio player; pausing and rewinding instead keeps it
+    alive for the next effect.
+    """
+
+    def on_eos(self):
+        self.pause()
+        self.seek(0.0)
+
+
+class SFXPool:
+    """Plays sound effects on a fixed set of preallocated players.
+
+    At most `voices` effects sound at once; when all are busy the one that
+    started longest ago is cut off for the new effect. A sound retriggered
+    within its cooldown is skipped, so a burst of 'hurt' instructions in a
+    fight doesn't stack copies of the same hit. Sounds come from
+    ResourceBank's decoded cache; call from the frame thread. With the
+    mixer on, voices are channels on its sfx bus instead of players.
+    """
+
+    def __init__(self, voices=SFX_MAX_VOICES, cooldown=SFX_COOLDOWN_SECONDS, volume=SFX_VOLUME):
+        self.cooldown = cooldown
+        self.volume = volume
+        self.mixer = get_mixer()
+        if self.mixer is not None:
+            self._players = [None] * voices  # Filled with mixer Channels as effects play
+        else:
+            self._players = [SFXVoice() for _ in range(voices)]
+        self._loaded = [None] * voices   # Sound name queued on each voice
+        self._started = [0.0] * voices   # When each voice last started
+        self._last_played = {}           # sound name -> time it last started
+        self.stolen = 0
+        self.skipped = 0
+
+    def trigger(self, action):
+        """Play one of the sound effects mapped to an animation action, if any"""
+        names = ResourceBank.ACTION_SOUNDS.get(action)
+        if not names:
+            return False
+        now = time.monotonic()
+        ready = [n for n in names if now - self._last_played.get(n, float("-inf")) >= self.cooldown]
+        if not ready:
+            self.skipped += 1
+            return False
+        return self.play(random.choice(ready), now)
+
+    def play(self, name, now=None):
+        """Play a sound effect by ResourceBank.SOUNDS name, honouring its cooldown"""
+        now = time.monotonic() if now is None else now
+        if now - self._last_played.get(name, float("-inf")) < self.cooldown:
+            self.skipped += 1
+            return False
+        sound = ResourceBank.get_sound(name)
+        if sound is None:
+            return False
+
+        voice = self._free_voice(name)
+        if voice is None:
+            voice = min(range(len(self._players)), key=self._started.__getitem__)
+            self.stolen += 1
+        player = self._players[voice]
+        if self.mixer is not None:
+            if player is not None:
+                player.stop()
+            self._players[voice] = self.mixer.play("sfx", sound.source, self.volume)
+            self._started[voice] = now
+            self._last_played[name] = now
+            return True
+        try:
+            player.pause()
+            if self._loaded[voice] == name:
+                player.seek(0.0)
+            else:
+                player.queue(sound.source)
+                if self._loaded[voice] is not None:
+                    # Swap to the queued effect; the driver player is reused when formats match
+                    player.next_source()
+                self._loaded[voice] = name
+            player.volume = self.volume
+            player.play()
+        except Exception as e:
+            print(f"Error playing sound '{name}': {e}")
+            return False
+        self._started[voice] = now
+        self._last_played[name] = now
+        return True
+
+    def stop_all(self):
+        for player in self._players:
+            if self.mixer is not None:
+                if player is not None:
+                    player.stop()
+            elif player.source is not None:
+                player.pause()
+                player.seek(0.0)
+
+    def shutdown(self):
+        if self.mixer is not None:
+            self.stop_all()
+            return
+        for player in self._players:
+            player.delete()
+
+    def _free_voice(self, name=None):
+        """An idle voice, preferring one that already has this sound queued"""
+        idle = [i for i, player in enumerate(self._players) if player is None or not player.playing]
+        if self.mixer is None:
+            for index in idle:
+                if self._loaded[index] == name:
+                    return index
+        return idle[0] if idle else None
@@ -0,0 +1,246 @@
+# story_backends.py
+import hashlib
+import json
+import os
+import random
+import threading
+from typing import Iterator, List, Protocol
+import httpx
+from groq_client import get_async_groq_client, get_groq_client
+from rate_limiter import call_with_retry, call_with_retry_async, get_rate_limiter
+from settings import (GROQ_CONNECT_TIMEOUT, GROQ_READ_TIMEOUT, OPENAI_COMPAT_BASE_URL, OPENAI_COMPAT_MODEL,
+                      STORY_BACKEND, STORY_MODEL)
+
+# Running token totals reported by non-streaming chat completions
+TOKEN_USAGE = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+_usage_lock = threading.Lock()
+
+
+def _record_usage(usage):
+    if usage is None:
+        return
+    with _usage_lock:
+        for key in TOKEN_USAGE:
+            value = usage.get(key) if isinstance(usage, dict) else getattr(usage, key, 0)
+            TOKEN_USAGE[key] += value or 0
+
+
+def estimate_tokens(messages, max_tokens):
+    """Rough token cost of a request for the tokens-per-minute bucket (~4 chars per token)"""
+    return max_tokens + sum(len(m["content"]) for m in messages) // 4
+
+
+class StoryBackend(Protocol):
+    """Anything that turns chat messages into the story JSON text"""
+
+    name: str
+    model: str
+    requires_api_key: bool
+
+    def complete(self, messages: List[dict], max_tokens: int, temperature: float) -> str:
+        """Return the full completion text"""
+
+    def stream(self, messages: List[dict], max_tokens: int, temperature: float) -> Iterator[str]:
+        """Yield the completion text as it is generated"""
+
+
+class GroqBackend:
+    """Groq chat completions through the shared, rate-limited client"""
+
+    name = "groq"
+    requires_api_key = True
+
+    def __init__(self, model=STORY_MODEL):
+        self.model = model
+
+    def _create(self, messages, max_tokens, temperature, **kwargs):
+        if not kwargs.get("stream"):
+            # Groq's JSON mode rejects streaming; streamed text is parsed leniently instead
+            kwargs["response_format"] = {"type": "json_object"}
+        resp = call_with_retry(
+            lambda: get_groq_client().chat.completions.create(
+                model=self.model,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                **kwargs
+            ),
+            limiter=get_rate_limiter("chat"),
+            tokens=estimate_tokens(messages, max_tokens)
+        )
+        _record_usage(getattr(resp, "usage", None))
+        return resp
+
+    def complete(self, messages, max_tokens, temperature):
+        return self._create(messages, max_tokens, temperature).choices[0].message.content
+
+    def stream(self, messages, max_tokens, temperature):
+        for chunk in self._create(messages, max_tokens, temperature, stream=True):
+            if chunk.choices:
+                yield chunk.choices[0].delta.content or ""
+
+    async def complete_async(self, messages, max_tokens, temperature):
+        """Cancellable completion on the shared async loop (see groq_client.run_async)"""
+        resp = await call_with_retry_async(
+            lambda: get_async_groq_client().chat.completions.create(
+                model=self.model,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                response_format={"type": "json_object"}
+            ),
+            limiter=get_rate_limiter("chat"),
+            tokens=estimate_tokens(messages, max_tokens)
+        )
+        _record_usage(getattr(resp, "usage", None))
+        return resp.choices[0].message.content
+
+
+class OpenAICompatibleBackend:
+    """Any local server speaking the OpenAI /chat/completions API (llama.cpp, vLLM, Ollama...)"""
+
+    name = "openai"
+    requires_api_key = False
+
+    def __init__(self, base_url=OPENAI_COMPAT_BASE_URL, model=OPENAI_COMPAT_MODEL, api_key=None):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        api_key = api_key or os.getenv("OPENAI_COMPAT_API_KEY")
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self._client = httpx.Client(
+            headers=headers,
+            timeout=httpx.Timeout(GROQ_READ_TIMEOUT, connect=GROQ_CONNECT_TIMEOUT)
+        )
+
+    def _payload(self, messages, max_tokens, temperature, stream=False):
+        return {
+            "model": self.model,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "response_format": {"type": "json_object"},
+            "stream": stream
+        }
+
+    def complete(self, messages, max_tokens, temperature):
+        resp = self._client.post(f"{self.base_url}/chat/completions",
+                                 json=self._payload(messages, max_tokens, temperature))
+        resp.raise_for_status()
+        body = resp.json()
+        _record_usage(body.get("usage"))
+        return body["choices"][0]["message"]["content"]
+
+    def stream(self, messages, max_tokens, temperature):
+        with self._client.stream("POST", f"{self.base_url}/chat/completions",
+                                 json=self._payload(messages, max_tokens, temperature, stream=True)) as resp:
+            resp.raise_for_status()
+            for line in resp.iter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                choices = json.loads(data).get("choices") or []
+                if choices:
+                    yield choices[0].get("delta", {}).get("content") or ""
+
+
+class TemplateBackend:
+    """Deterministic offline generator emitting the same story schema in microseconds.
+
+    Dialogue comes from a small word-level Markov chain over stock lines,
+    seeded from the prompt so the same prompt always gives the same story.
+    Useful for benchmarking the rest of the pipeline without the network.
+    """
+
+    name = "template"
+    model = "template"
+    requires_api_key = False
+
+    CORPUS = {
+        "narrator": [
+            "The forest was quiet until the wind carried a warning through the trees.",
+            "Shadows gathered at the edge of the clearing as the two rivals met.",
+            "The sun sank low and the old stones glowed with a strange light.",
+            "A hush fell over the woods as the hero stepped forward."
+        ],
+        "hero": [
+            "I will not let you harm this forest again.",
+            "Stand aside or face me here and now.",
+            "I can feel your dark presence in these woods.",
+            "This ends tonight, one way or another."
+        ],
+        "villain": [
+            "You are too late to stop what has begun.",
+            "Come closer and I will show you true power.",
+            "Then come find me, if you dare.",
+            "This forest belongs to the dark now."
+        ]
+    }
+    SPEAKERS = ["narrator", "hero", "villain", "hero", "villain", "narrator"]
+
+    def __init__(self):
+        self._chains = {speaker: self._build_chain(lines) for speaker, lines in self.CORPUS.items()}
+
+    @staticmethod
+    def _build_chain(lines):
+        chain = {}
+        for line in lines:
+            words = ["<s>"] + line.split() + ["</s>"]
+            for current, following in zip(words, words[1:]):
+                chain.setdefault(current, []).append(following)
+        return chain
+
+    def _line(self, rng, speaker, max_words=16):
+        chain = self._chains[speaker]
+        words, word = [], "<s>"
+        while len(words) < max_words:
+            word = rng.choice(chain[word])
+            if word == "</s>":
+                break
+            words.append(word)
+        text = " ".join(words)
+        return text if text.endswith((".", "!", "?")) else text + "."
+
+    def _story(self, messages):
+        prompt = messages[-1]["content"] if messages else ""
+        rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).hexdigest())
+        dialogue = [{"speaker": s, "text": self._line(rng, s)} for s in self.SPEAKERS]
+        instructions = []
+        for step in range(len(dialogue)):
+            character = "hero" if step % 2 == 0 else "villain"
+            action = rng.choice(["walk", "walk", "idle", "hurt"])
+            instruction = {"character": character, "action": action, "duration": rng.choice([1, 1.5, 2, 2.5, 3])}
+            if action == "walk":
+                instruction["direction"] = "right" if character == "hero" else "left"
+            instructions.append(instruction)
+        track = "scifi" if any(w in prompt.lower() for w in ("city", "space", "robot")) else "adventure"
+        return {"dialogue": dialogue, "instructions": instructions, "music": [{"action": "play", "track": track}]}
+
+    def complete(self, messages, max_tokens, temperature):
+        return json.dumps(self._story(messages))
+
+    def stream(self, messages, max_tokens, temperature):
+        text = self.complete(messages, max_tokens, temperature)
+        for start in range(0, len(text), 64):
+            yield text[start:start + 64]
+
+
+BACKENDS = {
+    "groq": GroqBackend,
+    "openai": OpenAICompatibleBackend,
+    "template": TemplateBackend
+}
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+def get_backend(name=None):
+    """Shared backend instance by name (default STORY_BACKEND)"""
+    name = name or STORY_BACKEND
+    with _instances_lock:
+        if name not in _instances:
+            if name not in BACKENDS:
+                raise ValueError(f"Unknown story backend '{name}', expected one of {sorted(BACKENDS)}")
+            _instances[name] = BACKENDS[name]()
+        return _instances[name]
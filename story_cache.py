@@ -0,0 +1,86 @@
+# story_cache.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from settings import STORY_CACHE_MAX_BYTES, STORY_CACHE_PATH, STORY_CACHE_TTL_SECONDS
+
+
+class StoryCache:
+    """SQLite cache of raw story completions.
+
+    Keys hash the model, system prompt, user prompt and sampling params.
+    Entries expire after ttl seconds and the least recently used ones are
+    evicted once the stored payloads exceed max_bytes.
+    """
+
+    def __init__(self, path=STORY_CACHE_PATH, ttl=STORY_CACHE_TTL_SECONDS, max_bytes=STORY_CACHE_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS stories ("
+            "key TEXT PRIMARY KEY, payload TEXT NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL, size INTEGER NOT NULL)"
+        )
+        self._db.commit()
+
+    @staticmethod
+    def make_key(model, system_prompt, prompt, max_tokens, temperature):
+        """Hash the request parameters into a cache key"""
+        system_hash = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()
+        payload = json.dumps([model, system_hash, prompt, max_tokens, temperature], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Return the cached completion text for key, or None if missing or expired"""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT payload, created FROM stories WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._db.execute("DELETE FROM stories WHERE key = ?", (key,))
+                    self._db.commit()
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE stories SET accessed = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, payload):
+        """Store a completion and evict expired or least recently used entries"""
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO stories (key, payload, created, accessed, size) VALUES (?, ?, ?, ?, ?)",
+                (key, payload, now, now, len(payload.encode("utf-8")))
+            )
+            self._evict(now)
+            self._db.commit()
+
+    def stats(self):
+        """Hit/miss counters and current cache size"""
+        with self._lock:
+            entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM stories").fetchone()
+            return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": size}
+
+    def _evict(self, now):
+        self._db.execute("DELETE FROM stories WHERE created < ?", (now - self.ttl,))
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM stories").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._db.execute("SELECT key, size FROM stories ORDER BY accessed").fetchall():
+            self._db.execute("DELETE FROM stories WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
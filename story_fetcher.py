@@ -2,34 +2,37 @@
 import os
 import json
 import random
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from groq import Groq
+from groq import BadRequestError
+from groq_client import run_async
+from hedging import LatencyTracker, hedged
 from resource_bank import ResourceBank
+from settings import (STORY_CACHE_REUSE, STORY_DECOMPOSED, STORY_HEDGE, STORY_HEDGE_BACKEND,
+                      STORY_HEDGE_MODEL, STORY_MODEL, STORY_SECTION_MAX_TOKENS)
+from singleflight import SingleFlight
+from story_backends import TOKEN_USAGE, GroqBackend, get_backend
+from story_cache import StoryCache
+from story_stream import StoryStreamParser, salvage_story_json
 
-def get_groq_story(prompt: str = None, max_tokens: int = 500, temperature: float = 0.7):
-    load_dotenv()
-    api_key = os.getenv("GROQ_API_KEY")
-    if not api_key:
-        raise ValueError("❌ No GROQ_API_KEY in .env file")
+SCENARIOS = [
+    "A tense confrontation in an ancient forest",
+    "A peaceful meeting between rivals at sunset",
+    "A magical duel in the heart of the woods"
+]
 
-    if not prompt:
-        scenarios = [
-            "A tense confrontation in an ancient forest",
-            "A peaceful meeting between rivals at sunset",
-            "A magical duel in the heart of the woods"
-        ]
-        prompt = f"{random.choice(scenarios)}. Include dramatic dialogue and physical actions."
-
-    system_prompt = """You are a storyteller and animation director. Generate:
+SYSTEM_PROMPT = """You are a storyteller and animation director. Generate:
 1. Dialogue (format: {"speaker": "narrator/hero/villain", "text": "content"})
 2. Animation instructions (format: {"character": "hero/villain", "action": "walk/idle/hurt", "direction": "left/right/up/down", "duration": seconds})
-3. Music instructions (format: {"action": "play/stop", "track": "adventure/scifi"})
+3. Music instructions (format: {"action": "play/stop", "track": "adventure/scifi", "line": dialogue index where the cue starts})
 
 Return STRICT JSON format:
 {
     "dialogue": [{"speaker": "narrator", "text": "The forest was quiet..."}],
     "instructions": [{"character": "hero", "action": "walk", "direction": "right", "duration": 2}],
-    "music": [{"action": "play", "track": "adventure"}]
+    "music": [{"action": "play", "track": "adventure", "line": 0}]
 }
 
 Rules:
@@ -38,94 +41,442 @@ Rules:
 - Use 'hurt' during fights
 - Each instruction should last 1-3 seconds
 - Music tracks should match the scene mood"""
+
+# Per-section prompts for decomposed generation
+SECTION_PROMPTS = {
+    "dialogue": """You are a storyteller. Write the dialogue for a short animated scene
+(format: {"speaker": "narrator/hero/villain", "text": "content"}).
+
+Return STRICT JSON format:
+{
+    "dialogue": [{"speaker": "narrator", "text": "The forest was quiet..."}]
+}
+
+Rules:
+- Include approach/retreat moments and physical action the animation can follow
+- Keep it to 4-8 lines""",
+    "instructions": """You are an animation director. Given a scene and its dialogue, generate animation instructions
+(format: {"character": "hero/villain", "action": "walk/idle/hurt", "direction": "left/right/up/down", "duration": seconds}).
+
+Return STRICT JSON format:
+{
+    "instructions": [{"character": "hero", "action": "walk", "direction": "right", "duration": 2}]
+}
+
+Rules:
+- Actions must match dialogue
+- Include approach/retreat movements
+- Use 'hurt' during fights
+- Each instruction should last 1-3 seconds""",
+    "music": """You are a film composer. Choose background music for a scene
+(format: {"action": "play/stop", "track": "adventure/scifi", "line": dialogue index where the cue starts}).
+
+Return STRICT JSON format:
+{
+    "music": [{"action": "play", "track": "adventure", "line": 0}]
+}
+
+Rules:
+- Music tracks should match the scene mood"""
+}
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="story-fetch")
+_section_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="story-section")
+_cache = None
+_latency = LatencyTracker()
+# Identical concurrent requests (same cache key) share one API call
+_inflight = SingleFlight()
+
+# Running totals for truncated completions recovered by _salvage_response and _request_section;
+# updated from parallel section workers, so only under _salvage_lock
+SALVAGE_STATS = {"salvaged": 0, "lost": 0, "rerequested": 0}
+_salvage_lock = threading.Lock()
+
+def fetch_story_async(**kwargs):
+    """Run get_groq_story on a background thread, returning a Future.
+
+    Lets the window open (and show a loading screen) while the LLM call runs.
+    The story's sounds are warmed on the same thread before the Future resolves.
+    """
+    return _executor.submit(lambda: warm_story(get_groq_story(**kwargs)))
+
+def warm_story(result):
+    """Preload the sounds and music of a (story, instructions, music) result and return it.
+
+    Call off the frame thread, so starting the scene never decodes audio.
+    """
+    ResourceBank.warm_up(result[1], result[2])
+    return result
+
+def _get_cache():
+    global _cache
+    if _cache is None:
+        _cache = StoryCache()
+    return _cache
+
+def _pick_prompt(prompt):
+    if not prompt:
+        prompt = f"{random.choice(SCENARIOS)}. Include dramatic dialogue and physical actions."
+    return prompt
+
+def _resolve_request(prompt, max_tokens, temperature, reuse_cache, system_prompt=SYSTEM_PROMPT, backend=None):
+    """Pick the prompt and look up the story cache; returns (prompt, cache_key, cached content)"""
+    load_dotenv()
+    prompt = _pick_prompt(prompt)
+    backend = backend or get_backend()
+
+    if reuse_cache is None:
+        reuse_cache = STORY_CACHE_REUSE or os.getenv("STORY_CACHE_REUSE") == "1"
+    cache_key = StoryCache.make_key(backend.model, system_prompt, prompt, max_tokens, temperature)
+    content = _get_cache().get(cache_key) if reuse_cache else None
+    if content is None and backend.requires_api_key:
+        api_key = os.getenv("GROQ_API_KEY")
+        if not api_key:
+            raise ValueError("❌ No GROQ_API_KEY in .env file")
+    return prompt, cache_key, content
+
+def _story_messages(prompt, system_prompt=SYSTEM_PROMPT):
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": prompt}
+    ]
+
+def normalize_dialogue_line(line):
+    """Convert a {"speaker", "text"} element into the {speaker: text} scene format"""
+    if line["speaker"] == "narrator":
+        return {"narrator": line["text"]}
+    return {line["speaker"]: line["text"]}
+
+def normalize_music(cmd):
+    """Validate a music instruction, returning None if it should be skipped"""
+    valid_tracks = list(ResourceBank.MUSIC.keys()) if hasattr(ResourceBank, 'MUSIC') else []
+    action = cmd.get("action", "play").lower()
+    if action not in ["play", "stop"]:
+        return None
+        
+    track = cmd.get("track")
+    if action == "play":
+        if track not in valid_tracks and valid_tracks:  # Only choose random if we have valid tracks
+            track = random.choice(valid_tracks)
+        elif not valid_tracks:
+            return None  # Skip if no valid tracks available
+            
+    music = {
+        "action": action,
+        "track": track if action == "play" else None
+    }
+    # Optional cue anchors: dialogue line index or seconds from scene start
+    try:
+        if cmd.get("line") is not None:
+            music["line"] = max(0, int(cmd["line"]))
+        elif cmd.get("at") is not None:
+            music["at"] = max(0.0, float(cmd["at"]))
+    except (TypeError, ValueError):
+        pass
+    return music
+
+def normalize_instruction(cmd):
+    """Validate an animation instruction, returning None if it should be skipped"""
+    if cmd.get("character") not in ["hero", "villain"]:
+        return None
+    valid_actions = ["walk", "idle", "hurt"]
+    action = cmd.get("action", "idle").lower()
+    if action not in valid_actions:
+        action = "idle"
+    
+    direction = None
+    if action == "walk":
+        direction = cmd.get("direction", random.choice(["left", "right"]))
+        if direction not in ["left", "right", "up", "down"]:
+            direction = random.choice(["left", "right"])
     
-    client = Groq(api_key=api_key)
+    duration = max(0.5, min(float(cmd.get("duration", 1.5)), 3.0))
+    
+    instruction = {
+        "character": cmd["character"],
+        "action": action,
+        "duration": duration
+    }
+    if direction:
+        instruction["direction"] = direction
+    return instruction
+
+# Section name in the completion JSON -> element normalizer
+NORMALIZERS = {
+    "dialogue": normalize_dialogue_line,
+    "instructions": normalize_instruction,
+    "music": normalize_music
+}
+
+def parse_story(response):
+    """Normalize a decoded completion into (story, instructions, music_instructions)"""
+    story = [normalize_dialogue_line(line) for line in response.get("dialogue", [])]
+    instructions = [i for i in map(normalize_instruction, response.get("instructions", [])) if i]
+    music_instructions = [m for m in map(normalize_music, response.get("music", [])) if m]
+    if not story:
+        raise ValueError("Completion contained no dialogue")
+    return story, instructions, music_instructions
+
+def fallback_story():
+    """The built-in default story used when generation fails"""
+    # Return default story with random music if available
+    default_music = []
     try:
-        resp = client.chat.completions.create(
-            model="llama-3.1-8b-instant",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=max_tokens,
-            temperature=temperature,
-            response_format={"type": "json_object"}
-        )
-
-        response = json.loads(resp.choices[0].message.content)
-        
-        # Process dialogue
-        story = []
-        for line in response.get("dialogue", []):
-            if line["speaker"] == "narrator":
-                story.append({"narrator": line["text"]})
-            else:
-                story.append({line["speaker"]: line["text"]})
-        
-        # Process music instructions
-        music_instructions = []
-        valid_tracks = list(ResourceBank.MUSIC.keys()) if hasattr(ResourceBank, 'MUSIC') else []
-        for cmd in response.get("music", []):
-            action = cmd.get("action", "play").lower()
-            if action not in ["play", "stop"]:
-                continue
-                
-            track = cmd.get("track")
-            if action == "play":
-                if track not in valid_tracks and valid_tracks:  # Only choose random if we have valid tracks
-                    track = random.choice(valid_tracks)
-                elif not valid_tracks:
-                    continue  # Skip if no valid tracks available
-                    
-            music_instructions.append({
-                "action": action,
-                "track": track if action == "play" else None
-            })
+        if hasattr(ResourceBank, 'MUSIC') and ResourceBank.MUSIC:
+            default_music = [{"action": "play", "track": random.choice(list(ResourceBank.MUSIC.keys()))}]
+    except Exception as e:
+        print(f"Error getting default music: {e}")
         
-        # Process animation instructions
+    return [
+        {"narrator": "The hero stands ready in the mystical forest."},
+        {"hero": "I can feel your dark presence!"},
+        {"villain": "Then come find me, if you dare!"}
+    ], [
+        {"character": "hero", "action": "walk", "direction": "right", "duration": 2},
+        {"character": "villain", "action": "walk", "direction": "left", "duration": 2}
+    ], default_music
+
+def generate_section(section, prompt, temperature=0.7, reuse_cache=None, dialogue=None, backend=None):
+    """Request one section ("dialogue", "instructions" or "music") on its own.
+
+    Uses the section's smaller max_tokens from STORY_SECTION_MAX_TOKENS and
+    returns the list of normalized elements. The instructions request is
+    given the dialogue so actions can follow it.
+    """
+    elements = _request_section(section, prompt, temperature, reuse_cache, dialogue, backend)
+    return [e for e in map(NORMALIZERS[section], elements) if e]
+
+def _request_section(section, prompt, temperature, reuse_cache, dialogue=None, backend=None):
+    """Raw elements for one section, as returned by the model"""
+    user_prompt = prompt
+    if dialogue:
+        lines = "\n".join(f"{speaker}: {text}" for line in dialogue for speaker, text in line.items())
+        user_prompt = f"{prompt}\n\nDialogue:\n{lines}"
+    max_tokens = STORY_SECTION_MAX_TOKENS[section]
+    system_prompt = SECTION_PROMPTS[section]
+    backend = backend or get_backend()
+    user_prompt, cache_key, content = _resolve_request(user_prompt, max_tokens, temperature, reuse_cache,
+                                                       system_prompt, backend)
+    cached = content is not None
+    if not cached:
+        try:
+            content = _inflight.do(cache_key, backend.complete, _story_messages(user_prompt, system_prompt),
+                                   max_tokens, temperature)
+        except BadRequestError as e:
+            content = _failed_generation(e)
+            if content is None:
+                raise
+    try:
+        elements = json.loads(content).get(section, [])
+    except ValueError:
+        # Truncated again: keep its complete elements rather than dropping the section
+        response, stats = salvage_story_json(content)
+        _record_salvage(stats)
+        print(f"Salvaged truncated {section}: {stats['salvaged']} elements kept, {stats['lost']} lost")
+        return response.get(section, [])
+    if not cached:
+        _get_cache().put(cache_key, content)
+    return elements
+
+def _hedged_completion(prompt, max_tokens, temperature):
+    """(completion text, "primary" or "backup") from a hedged pair of requests.
+
+    The backup (STORY_HEDGE_MODEL, or the same model) is only fired once the
+    primary has run past the observed latency percentile; the loser is
+    cancelled. With STORY_HEDGE_BACKEND = "template" the backup is the
+    offline generator instead, so a slow API degrades to a canned story.
+    Only the primary's latency feeds the deadline (see hedging.hedged).
+    """
+    messages = _story_messages(prompt)
+
+    def request(model):
+        async def call():
+            return await GroqBackend(model).complete_async(messages, max_tokens, temperature)
+        return call
+
+    def offline():
+        async def call():
+            return await asyncio.to_thread(get_backend(STORY_HEDGE_BACKEND).complete,
+                                           messages, max_tokens, temperature)
+        return call
+
+    def is_valid(content):
+        try:
+            json.loads(content)
+            return True
+        except (TypeError, ValueError):
+            return False
+
+    deadline = _latency.deadline()
+    backup = request(STORY_HEDGE_MODEL or STORY_MODEL) if STORY_HEDGE_BACKEND == "groq" else offline()
+    content, winner = run_async(hedged(
+        request(STORY_MODEL), backup,
+        deadline, validate=is_valid, tracker=_latency
+    )).result()
+    if winner == "backup":
+        print(f"Hedged story request won by backup after {deadline:.2f}s deadline")
+    return content, winner
+
+def _failed_generation(error):
+    """The partial completion Groq attaches to json_validate_failed errors, if any"""
+    body = getattr(error, "body", None)
+    if isinstance(body, dict):
+        body = body.get("error", body)
+        if isinstance(body, dict):
+            return body.get("failed_generation")
+    return None
+
+def _salvage_response(content, prompt, temperature, reuse_cache, backend=None):
+    """Keep every complete element of a broken completion and re-request only empty sections"""
+    response, stats = salvage_story_json(content)
+    missing = [section for section in NORMALIZERS if not response.get(section)]
+    for section in missing:
+        dialogue = None
+        if section == "instructions" and response.get("dialogue"):
+            dialogue = [normalize_dialogue_line(line) for line in response["dialogue"]]
+        try:
+            response[section] = _request_section(section, prompt, temperature, reuse_cache, dialogue, backend)
+        except Exception as e:
+            print(f"Re-request for {section} failed: {e}")
+    _record_salvage(stats, rerequested=len(missing))
+    print(f"Salvaged truncated story: {stats['salvaged']} elements kept, {stats['lost']} lost, "
+          f"re-requested {missing or 'nothing'}")
+    return response
+
+def _record_salvage(stats, rerequested=0):
+    with _salvage_lock:
+        for key in ("salvaged", "lost"):
+            SALVAGE_STATS[key] += stats[key]
+        SALVAGE_STATS["rerequested"] += rerequested
+
+def _get_story_decomposed(prompt, temperature, reuse_cache, backend=None):
+    """Generate the story as concurrent per-section requests.
+
+    Dialogue and music (which only needs the scene mood) run in parallel;
+    animation instructions follow as soon as the dialogue is in, so wall
+    clock is dialogue + instructions rather than one long completion.
+    Only a dialogue failure fails the story; a failed instructions or music
+    request leaves that section empty.
+    """
+    prompt = _pick_prompt(prompt)
+    dialogue_future = _section_executor.submit(generate_section, "dialogue", prompt, temperature, reuse_cache,
+                                               backend=backend)
+    music_future = _section_executor.submit(generate_section, "music", prompt, temperature, reuse_cache,
+                                            backend=backend)
+    story = dialogue_future.result()
+    if not story:
+        raise ValueError("Completion contained no dialogue")
+    try:
+        instructions = generate_section("instructions", prompt, temperature, reuse_cache, dialogue=story,
+                                        backend=backend)
+    except Exception as e:
+        print(f"Instructions request failed, continuing without animation: {e}")
         instructions = []
-        valid_actions = ["walk", "idle", "hurt"]
-        for cmd in response.get("instructions", []):
-            if cmd.get("character") in ["hero", "villain"]:
-                action = cmd.get("action", "idle").lower()
-                if action not in valid_actions:
-                    action = "idle"
-                
-                direction = None
-                if action == "walk":
-                    direction = cmd.get("direction", random.choice(["left", "right"]))
-                    if direction not in ["left", "right", "up", "down"]:
-                        direction = random.choice(["left", "right"])
-                
-                duration = max(0.5, min(float(cmd.get("duration", 1.5)), 3.0))
-                
-                instruction = {
-                    "character": cmd["character"],
-                    "action": action,
-                    "duration": duration
-                }
-                if direction:
-                    instruction["direction"] = direction
-                
-                instructions.append(instruction)
-        
-        return story, instructions, music_instructions
-        
+    try:
+        music = music_future.result()
     except Exception as e:
-        print(f"API Error: {e}")
-        # Return default story with random music if available
-        default_music = []
+        print(f"Music request failed, continuing without music: {e}")
+        music = []
+    return story, instructions, music
+
+def get_groq_story(prompt: str = None, max_tokens: int = 500, temperature: float = 0.7,
+                   reuse_cache: bool = None, fallback: bool = True, decomposed: bool = None,
+                   hedge: bool = None, backend=None):
+    """Generate (story, instructions, music_instructions) for a scene.
+
+    Every successful completion is written to the story cache; with
+    reuse_cache (or STORY_CACHE_REUSE) a cached completion for the same
+    model, prompts and sampling params is returned without an API call.
+    With fallback=False, errors are raised instead of returning the
+    built-in default story. decomposed (default STORY_DECOMPOSED) splits
+    generation into concurrent per-section requests; max_tokens then comes
+    from STORY_SECTION_MAX_TOKENS. hedge (default STORY_HEDGE) fires a
+    backup request when the first one is slower than usual. Concurrent
+    calls with identical parameters share one in-flight request. backend (a
+    StoryBackend or its name, default STORY_BACKEND) chooses where the
+    completion comes from; hedging only applies to the Groq backend.
+    """
+    if backend is None or isinstance(backend, str):
+        backend = get_backend(backend)
+    if hedge is None:
+        hedge = STORY_HEDGE
+    if decomposed is None:
+        decomposed = STORY_DECOMPOSED
+    if decomposed:
         try:
-            if hasattr(ResourceBank, 'MUSIC') and ResourceBank.MUSIC:
-                default_music = [{"action": "play", "track": random.choice(list(ResourceBank.MUSIC.keys()))}]
+            return _get_story_decomposed(prompt, temperature, reuse_cache, backend)
         except Exception as e:
-            print(f"Error getting default music: {e}")
-            
-        return [
-            {"narrator": "The hero stands ready in the mystical forest."},
-            {"hero": "I can feel your dark presence!"},
-            {"villain": "Then come find me, if you dare!"}
-        ], [
-            {"character": "hero", "action": "walk", "direction": "right", "duration": 2},
-            {"character": "villain", "action": "walk", "direction": "left", "duration": 2}
-        ], default_music
\ No newline at end of file
+            print(f"API Error: {e}")
+            if not fallback:
+                raise
+            return fallback_story()
+
+    prompt, cache_key, content = _resolve_request(prompt, max_tokens, temperature, reuse_cache, backend=backend)
+    
+    def complete():
+        """(content, winner); only a "primary" result belongs under cache_key"""
+        try:
+            if hedge and backend.name == "groq":
+                return _hedged_completion(prompt, max_tokens, temperature)
+            return backend.complete(_story_messages(prompt), max_tokens, temperature), "primary"
+        except BadRequestError as e:
+            # Truncated JSON comes back as a validation error carrying the partial text
+            partial = _failed_generation(e)
+            if partial is None:
+                raise
+            return partial, "primary"
+
+    try:
+        if content is None:
+            content, winner = _inflight.do(cache_key, complete)
+            try:
+                response = json.loads(content)
+            except ValueError:
+                result = parse_story(_salvage_response(content, prompt, temperature, reuse_cache, backend))
+            else:
+                result = parse_story(response)
+                if winner == "primary":
+                    # A backup model's or the template's story must not replay as this model's
+                    _get_cache().put(cache_key, content)
+        else:
+            result = parse_story(json.loads(content))
+        return result
+        
+    except Exception as e:
+        print(f"API Error: {e}")
+        if not fallback:
+            raise
+        return fallback_story()
+
+def stream_groq_story(prompt: str = None, max_tokens: int = 500, temperature: float = 0.7,
+                      reuse_cache: bool = None, backend=None):
+    """Stream a story, yielding (section, element) as soon as each element is complete.
+
+    section is "dialogue", "instructions" or "music" and element is already
+    normalized, so a scene can start on the first dialogue line instead of
+    waiting for the whole completion. The full completion is cached once
+    the stream ends. Errors propagate to the caller.
+    """
+    if backend is None or isinstance(backend, str):
+        backend = get_backend(backend)
+    prompt, cache_key, content = _resolve_request(prompt, max_tokens, temperature, reuse_cache, backend=backend)
+    parser = StoryStreamParser()
+    if content is not None:
+        chunks = [content]
+    else:
+        chunks = backend.stream(_story_messages(prompt), max_tokens, temperature)
+
+    for text in chunks:
+        for section, element in parser.feed(text):
+            try:
+                normalized = NORMALIZERS[section](element)
+            except (KeyError, TypeError, ValueError) as e:
+                print(f"Skipping malformed {section} element: {e}")
+                continue
+            if normalized:
+                yield section, normalized
+
+    if content is None and parser.complete:
+        # Without JSON mode the model may wrap the object in a code fence; cache just the object
+        text = parser.text
+        _get_cache().put(cache_key, text[text.index("{"):text.rindex("}") + 1])
@@ -0,0 +1,142 @@
+# story_pool.py
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from rate_limiter import backoff_delay
+from settings import STORY_POOL_CONCURRENCY, STORY_POOL_REFILL_RETRIES, STORY_POOL_SIZE
+from story_fetcher import get_groq_story, warm_story
+
+
+class StoryPool:
+    """Keeps a number of generated stories ready for instant scene starts.
+
+    Background workers refill the pool up to size with at most concurrency
+    requests in flight. next_story pops a ready story in O(1) and only makes
+    a live API call when the pool is empty. Stories come back with their
+    sounds already warmed (see warm_story). A failed refill is retried with
+    backoff up to `retries` times before it is counted as a failure.
+    """
+
+    def __init__(self, size=STORY_POOL_SIZE, concurrency=STORY_POOL_CONCURRENCY, prompts=None,
+                 retries=STORY_POOL_REFILL_RETRIES):
+        self.size = size
+        self.retries = retries
+        self._prompts = itertools.cycle(prompts) if isinstance(prompts, (list, tuple)) else prompts
+        self._ready = deque()
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="story-pool")
+        self._closed = threading.Event()  # Also wakes refills waiting out a backoff
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+        self.refill_retries = 0
+        self.refill_latencies = deque(maxlen=100)
+
+        self._refill()
+
+    @property
+    def depth(self):
+        """Number of stories ready to pop"""
+        return len(self._ready)
+
+    def next_story(self):
+        """Return (story, instructions, music_instructions), from the pool if possible"""
+        result = self._pop()
+        if result is None:
+            result = warm_story(get_groq_story(prompt=self._next_prompt()))
+        return result
+
+    def next_story_async(self):
+        """Future for the next story; already resolved when the pool has one ready"""
+        result = self._pop()
+        if result is None:
+            # Run the live call on its own thread rather than queueing behind refills
+            future = Future()
+            prompt = self._next_prompt()
+
+            def fetch():
+                try:
+                    future.set_result(warm_story(get_groq_story(prompt=prompt)))
+                except Exception as e:
+                    future.set_exception(e)
+
+            threading.Thread(target=fetch, name="story-live", daemon=True).start()
+            return future
+        future = Future()
+        future.set_result(result)
+        return future
+
+    def metrics(self):
+        """Pool depth, hit/miss counts and refill latency in seconds"""
+        with self._lock:
+            latencies = sorted(self.refill_latencies)
+            counts = {
+                "depth": self.depth,
+                "in_flight": self._in_flight,
+                "hits": self.hits,
+                "misses": self.misses,
+                "failures": self.failures,
+                "retries": self.refill_retries
+            }
+        return {
+            **counts,
+            "refill_latency_avg": sum(latencies) / len(latencies) if latencies else None,
+            "refill_latency_p95": latencies[int(0.95 * (len(latencies) - 1))] if latencies else None
+        }
+
+    def shutdown(self):
+        """Stop refilling and drop queued requests"""
+        self._closed.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _pop(self):
+        """Pop a ready story (None if empty) and top the pool back up"""
+        with self._lock:
+            try:
+                result = self._ready.popleft()
+                self.hits += 1
+            except IndexError:
+                result = None
+                self.misses += 1
+        self._refill()
+        return result
+
+    def _next_prompt(self):
+        if self._prompts is None:
+            return None  # get_groq_story picks one of its scenarios
+        with self._lock:
+            return next(self._prompts, None)
+
+    def _refill(self):
+        with self._lock:
+            if self._closed.is_set():
+                return
+            needed = self.size - len(self._ready) - self._in_flight
+            self._in_flight += max(0, needed)
+        for _ in range(needed):
+            self._executor.submit(self._fetch, self._next_prompt())
+
+    def _fetch(self, prompt):
+        start = time.monotonic()
+        for attempt in range(self.retries + 1):
+            try:
+                result = warm_story(get_groq_story(prompt=prompt, fallback=False))
+                break
+            except Exception as e:
+                print(f"Story pool refill failed: {e}")
+                if attempt == self.retries or self._closed.wait(backoff_delay(attempt, e)):
+                    with self._lock:
+                        self.failures += 1
+                        self._in_flight -= 1
+                    return
+                with self._lock:
+                    self.refill_retries += 1
+        with self._lock:
+            self.refill_latencies.append(time.monotonic() - start)
+            self._ready.append(result)
+            self._in_flight -= 1
@@ -0,0 +1,124 @@
+# story_stream.py
+import json
+
+
+class StoryStreamParser:
+    """Incremental parser for the story completion JSON.
+
+    Text is fed as tokens arrive. Each object inside one of the top-level
+    arrays ("dialogue", "instructions", "music") is emitted as
+    (section, element) as soon as its closing brace is seen, without
+    waiting for the rest of the document. Only the unfinished element (or
+    key) is kept for rescanning, so each character is scanned once.
+    """
+
+    def __init__(self):
+        self._chunks = []  # Everything fed, joined only when text is read
+        self.opened_sections = set()  # Arrays whose opening bracket has arrived
+        self.closed_sections = set()  # Arrays whose closing bracket has arrived
+        self.complete = False         # Top-level object closed
+        self.lost = 0                 # Elements that closed but failed to decode
+        self._window = ""  # Unconsumed tail of the text; starts and positions below are relative to it
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._last_key = None
+        self._section = None
+        self._element_start = None
+
+    @property
+    def text(self):
+        """All text fed so far"""
+        if len(self._chunks) > 1:
+            self._chunks = ["".join(self._chunks)]
+        return self._chunks[0] if self._chunks else ""
+
+    def feed(self, chunk):
+        """Consume more text and return the list of newly completed elements"""
+        self._chunks.append(chunk)
+        completed = []
+        text = self._window + chunk
+        for pos in range(len(self._window), len(text)):
+            char = text[pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._string_start is not None:
+                        self._last_key = self._decode(text[self._string_start:pos + 1])
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = pos if self._depth == 1 else None
+            elif char in "{[":
+                self._depth += 1
+                if char == "[" and self._depth == 2:
+                    self._section = self._last_key
+                    if self._section:
+                        self.opened_sections.add(self._section)
+                elif char == "{" and self._depth == 3 and self._section:
+                    self._element_start = pos
+            elif char in "}]":
+                if char == "}" and self._depth == 3 and self._element_start is not None:
+                    element = self._decode(text[self._element_start:pos + 1])
+                    if isinstance(element, dict):
+                        completed.append((self._section, element))
+                    else:
+                        self.lost += 1
+                    self._element_start = None
+                elif char == "]" and self._depth == 2:
+                    if self._section:
+                        self.closed_sections.add(self._section)
+                    self._section = None
+                elif char == "}" and self._depth == 1:
+                    self.complete = True
+                self._depth -= 1
+
+        # Keep only what an unfinished element or key will still need to decode
+        keep = len(text)
+        if self._element_start is not None:
+            keep = min(keep, self._element_start)
+        if self._in_string and self._string_start is not None:
+            keep = min(keep, self._string_start)
+        self._window = text[keep:]
+        if self._element_start is not None:
+            self._element_start -= keep
+        if self._string_start is not None:
+            self._string_start = self._string_start - keep if self._in_string else None
+        return completed
+
+    @property
+    def pending_element(self):
+        """True if the text ends inside an unfinished array element"""
+        return self._element_start is not None
+
+    @staticmethod
+    def _decode(fragment):
+        try:
+            return json.loads(fragment)
+        except ValueError:
+            return None
+
+
+def salvage_story_json(text):
+    """Recover every complete element from a truncated or malformed completion.
+
+    Returns (response, stats): response maps each section to the raw
+    elements that were recovered, and stats counts salvaged vs. lost
+    elements and lists the sections whose arrays never closed.
+    """
+    parser = StoryStreamParser()
+    response = {}
+    for section, element in parser.feed(text):
+        response.setdefault(section, []).append(element)
+    stats = {
+        "salvaged": sum(len(elements) for elements in response.values()),
+        "lost": parser.lost + (1 if parser.pending_element else 0),
+        "truncated_sections": sorted(parser.opened_sections - parser.closed_sections)
+    }
+    return response, stats
@@ -3,19 +3,64 @@ import arcade.future.background as background
 from settings import *
 from character import CharacterSprite
 from scene import Scene
-from tts_controller import TTSController
-from resource_bank import ResourceBank
+from tts_worker import TTSWorker, ScenePrefetcher, SpeechHandle
+from music_cues import MusicScheduler
+from sfx_pool import SFXPool
+from mixer import get_mixer
 
 class StoryWindow(arcade.Window):
-    def __init__(self, scene: Scene):
+    def __init__(self, scene: Scene = None):
         super().__init__(WINDOW_WIDTH, WINDOW_HEIGHT, "Dynamic Story Engine", resizable=True)
-        self.scene = scene
+        self.scene = None
         self.background_color = arcade.color.DARK_SLATE_GRAY  # Fallback color
         self.camera = arcade.Camera2D()
+        self.backgrounds = background.ParallaxGroup()
+        self.character_sprites = arcade.SpriteList()
+
+        # Movement and animation state
+        self.hero_movement = {k: False for k in ["up","down","left","right"]}
+        self.villain_movement = {k: False for k in ["up","down","left","right"]}
+        self.movement_speed = PLAYER_SPEED
+        
+        # Dialogue system
+        self.current_line = 0
+        self.dialogue_alpha = 0.0
+        self.fade_state = "fadein"
+        self.dialogue_timer = 0
+        self.dialogue_texts = {}  # line index -> arcade.Text, laid out once per line
+        self.dialogue_complete = True  # False while more lines may still be appended (streaming)
+        
+        # Animation system
+        self.animation_controller = None
+        self.animation_instructions = []
+        self.current_instruction_index = 0
+        self.instruction_timer = 0
+        self.tts = TTSWorker()
+        # Without a probed audio output there is nothing to synthesize for
+        self.speech_enabled = TTS_ENABLED and self.tts.controller.audio_backend["backend"] is not None
+        self.tts_prefetcher = None
+        self.current_speaker = None
+        self.current_speech = None
+        self.speech_finished_at = None
+        self.music = MusicScheduler()
+        self.sfx = SFXPool()
+        self.on_next_story = None  # Called when the viewer asks for a new story (N key)
+
+        if scene is not None:
+            self.load_scene(scene)
+
+    def load_scene(self, scene: Scene):
+        """Build backgrounds and characters for a scene and start its dialogue.
+
+        The window can be opened without a scene (e.g. behind a LoadingView
+        while the story is fetched); nothing is drawn or updated until then.
+        """
+        self.unload_scene()
+        self.scene = scene
         
         # Background setup with error handling
         self.backgrounds = background.ParallaxGroup()
-        bg_layer_size_px = (WINDOW_WIDTH, SCALED_BG_LAYER_HEIGHT_PX)
+        bg_layer_size_px = (self.width, SCALED_BG_LAYER_HEIGHT_PX)
         depths = [10.0, 5.0, 3.0, 1.0]
         
         # Try to load each background layer
@@ -50,78 +95,53 @@ class StoryWindow(arcade.Window):
         self.villain.position = 600, 150
         self.character_sprites.append(self.villain)
 
-        # Movement and animation state
-        self.hero_movement = {k: False for k in ["up","down","left","right"]}
-        self.villain_movement = {k: False for k in ["up","down","left","right"]}
-        self.movement_speed = PLAYER_SPEED
-        
-        # Dialogue system
         self.current_line = 0
         self.dialogue_alpha = 0.0
         self.fade_state = "fadein"
         self.dialogue_timer = 0
-        
-        # Animation system
-        self.animation_instructions = []
-        self.current_instruction_index = 0
-        self.instruction_timer = 0
-        self.tts = TTSController()
-        self.current_speaker = None
-        self.current_speech_proc = None
-        self.music_instructions = []
-        self.current_music = None
-        self.music_player = None
-
-    def _handle_music_instructions(self):
-        """Process music instructions from the story"""
-        if not self.music_instructions:
-            return
-            
-        for instruction in self.music_instructions:
-            action = instruction.get("action")
-            track = instruction.get("track")
-            
-            if action == "play":
-                self.play_music(track)
-            elif action == "stop":
-                self.stop_music()
-
-    def play_music(self, track_name):
-        """Play background music without interrupting dialogue"""
-        try:
-            # First stop any existing music
-            self.stop_music()
-                
-            if not track_name:
-                return
-                    
-            music_path = ResourceBank.MUSIC.get(track_name)
-            if music_path:
-                self.current_music = arcade.Sound(music_path, streaming=True)
-                # Play music at lower volume (0.3) to leave room for dialogue
-                self.music_player = self.current_music.play(volume=0.3, loop=True)
-                if not self.music_player:
-                    print(f"Failed to play music track: {track_name}")
-        except Exception as e:
-            print(f"Error playing music '{track_name}': {e}")
-            
-    def stop_music(self):
-        """Stop background music immediately"""
-        try:
-            if self.current_music and self.music_player:
-                self.current_music.stop(self.music_player)
-        except Exception as e:
-            print(f"Error stopping music: {e}")
-        finally:
-            self.current_music = None
-            self.music_player = None
+        self.dialogue_texts = {}
+        self.dialogue_complete = True
+        if self.speech_enabled:
+            self.tts_prefetcher = ScenePrefetcher(self.tts.controller, scene.dialogue)
+
+    def unload_scene(self):
+        """Stop the current scene's speech, prefetching and music and stop drawing it.
+
+        Called before a new scene loads, and when a LoadingView is shown so
+        the old scene doesn't keep playing (and drawing over it) meanwhile.
+        """
+        if self.current_speech:
+            self.current_speech.cancel()
+            self.current_speech = None
+        if self.tts_prefetcher:
+            self.tts_prefetcher.shutdown()
+            self.tts_prefetcher = None
+        self.music.stop()
+        self.sfx.stop_all()
+        self.scene = None
+        self.dialogue_texts = {}
+
+    def append_dialogue(self, line):
+        """Add a line to the running scene (e.g. while the story is still streaming)"""
+        self.scene.dialogue.append(line)
+        if self.tts_prefetcher:
+            self.tts_prefetcher.prefetch(len(self.scene.dialogue) - 1)
+
+    def load_music(self, music_instructions):
+        """Schedule the scene's music cues (see MusicScheduler)"""
+        self.music.load(music_instructions, len(self.scene.dialogue))
 
     def cleanup(self):
         """Clean up resources"""
-        self.stop_music()
-        if hasattr(self, 'current_speech_proc') and self.current_speech_proc:
-            if self.current_speech_proc.poll() is None:
-                self.current_speech_proc.terminate()
+        self.music.stop()
+        self.sfx.shutdown()
+        if get_mixer():
+            get_mixer().stop()
+        if self.current_speech:
+            self.current_speech.cancel()
+        self.tts.shutdown()
+        if self.tts_prefetcher:
+            self.tts_prefetcher.shutdown()
 
 
     def pan_camera_to_player(self):
@@ -129,26 +149,33 @@ class StoryWindow(arcade.Window):
         target_y = self.height // 2
         self.camera.position = arcade.math.lerp_2d(self.camera.position, (target_x, target_y), CAMERA_SPEED)
 
-    def draw_wrapped_text(self, text, center_x, start_y, max_width, font_size, alpha):
-        """
-        Draw text wrapped inside max_width with alpha transparency.
-        It uses arcade.draw_text's built-in word wrapping (width param).
-        Starts drawing from start_y and moves downward as text flows.
+    def dialogue_text(self, index):
+        """The wrapped arcade.Text for a dialogue line, built once and reused.
+
+        Laying out glyphs is the expensive part, so each frame only moves the
+        text and changes its alpha; on_resize drops the cache since the wrap
+        width changes.
         """
-        # arcade.draw_text automatically wraps text if given width
-        arcade.draw_text(
-            text,
-            center_x - max_width // 2,  # correct argument: x
-            start_y,                    # correct argument: y
-            color=(*arcade.color.WHITE[:3], int(alpha * 255)),
-            font_size=font_size,
-            width=max_width,
-            multiline=True,
-            anchor_x="left"
-        )
+        text = self.dialogue_texts.get(index)
+        if text is None:
+            max_width = int(self.width * 0.8)
+            text = arcade.Text(
+                list(self.scene.dialogue[index].values())[0],
+                self.camera.position[0] - max_width // 2,
+                70,  # A little above the bottom of the screen
+                color=(*arcade.color.WHITE[:3], 0),
+                font_size=18,
+                width=max_width,
+                multiline=True,
+                anchor_x="left"
+            )
+            self.dialogue_texts[index] = text
+        return text
 
 
     def on_draw(self):
+        if self.scene is None:
+            return  # A LoadingView is drawing while the story is fetched
         self.clear()
         with self.camera.activate():
             self.backgrounds.offset = self.camera.bottom_left
@@ -159,21 +186,26 @@ class StoryWindow(arcade.Window):
 
             self.character_sprites.draw()
 
-            # Draw wrapped dialogue text with fade alpha
-            dialogue_text = list(self.scene.dialogue[self.current_line].values())[0]
-            max_width = int(self.width * 0.8)
-            # Start a little above bottom + font size * lines (approximate)
-            start_y = 70
-            self.draw_wrapped_text(dialogue_text, self.camera.position[0], start_y, max_width, 18, self.dialogue_alpha)
+            # Draw the cached dialogue text, following the camera with fade alpha
+            text = self.dialogue_text(self.current_line)
+            x = self.camera.position[0] - text.width // 2
+            if text.x != x:
+                text.x = x
+            alpha = int(self.dialogue_alpha * 255)
+            if text.color[3] != alpha:
+                text.color = (*arcade.color.WHITE[:3], alpha)
+            text.draw()
 
 
     def on_update(self, delta_time):
+        if self.scene is None:
+            return
         # Movement
         self._handle_character_movement(delta_time)
         self.pan_camera_to_player()
-        self._update_dialogue_fade()
+        self._update_dialogue_fade(delta_time)
         self._update_animations(delta_time)
-        self._handle_music_instructions()
+        self.music.update(delta_time, self.current_line)
 
     def _update_animations(self, delta_time):
         if not self.animation_controller or not self.animation_instructions:
@@ -255,30 +287,16 @@ class StoryWindow(arcade.Window):
         self.hero.update_animation(hero_moving, dt)
         self.villain.update_animation(villain_moving, dt)
 
-    def _update_dialogue_fade(self):
-        if self.fade_state == "fadein":
-            self.dialogue_alpha += FADE_IN_SPEED
-            if self.dialogue_alpha >= 1.0:
-                self.fade_state = "display"
-                self.dialogue_alpha = 1.0
-                self.dialogue_timer = 0
-        elif self.fade_state == "display":
-            self.dialogue_timer += 1
-            if self.dialogue_timer >= DIALOGUE_DISPLAY_TIME:
-                self.fade_state = "fadeout"
-        elif self.fade_state == "fadeout":
-            self.dialogue_alpha -= FADE_OUT_SPEED
-            if self.dialogue_alpha <= 0:
-                self.fade_state = "fadein"
-                self.dialogue_alpha = 0
-                self.current_line = (self.current_line + 1) % len(self.scene.dialogue)
-
     def on_key_press(self, key, modifiers):
-        if key == arcade.key.SPACE:
+        if key == arcade.key.SPACE and self.scene is not None and self._has_next_line():
+            if self.current_speech:
+                self.current_speech.cancel()
             self.current_line = (self.current_line + 1) % len(self.scene.dialogue)
             self.dialogue_alpha = 0.0
             self.fade_state = "fadein"
             self.dialogue_timer = 0
+        if key == arcade.key.N and self.on_next_story:
+            self.on_next_story()
         if key == arcade.key.W: self.hero_movement["up"] = True
         elif key == arcade.key.S: self.hero_movement["down"] = True
         elif key == arcade.key.A: self.hero_movement["left"] = True
@@ -301,24 +319,32 @@ class StoryWindow(arcade.Window):
     def on_resize(self, width, height):
         super().on_resize(width, height)
         self.camera.match_window()
+        self.dialogue_texts = {}  # Re-wrap dialogue at the new width
         full_width_size = (width, SCALED_BG_LAYER_HEIGHT_PX)
         for layer, depth in self.backgrounds:
             layer.size = full_width_size
 
     def speak_dialogue(self, line):
-        """Speak the current line of dialogue"""
-        if self.current_speech_proc and self.current_speech_proc.poll() is None:
-            self.current_speech_proc.terminate()
+        """Queue the current line of dialogue on the background TTS worker"""
+        if self.current_speech:
+            self.current_speech.cancel()
         
         speaker = list(line.keys())[0]
         text = list(line.values())[0]
         self.current_speaker = speaker
-        self.tts.speak_line(speaker, text)
+        self.speech_finished_at = None
+        if not self.speech_enabled:
+            self.current_speech = None
+            return
+        self.current_speech = self.tts.speak(
+            speaker, text,
+            on_complete=self._on_speech_complete,
+            audio=self.tts_prefetcher.get(self.current_line)
+        )
 
-    # Modify the _update_dialogue_fade method:
-    def _update_dialogue_fade(self):
+    def _update_dialogue_fade(self, delta_time):
         if self.fade_state == "fadein":
-            self.dialogue_alpha += FADE_IN_SPEED
+            self.dialogue_alpha += delta_time / DIALOGUE_FADE_IN_SECONDS
             if self.dialogue_alpha >= 1.0:
                 self.fade_state = "display"
                 self.dialogue_alpha = 1.0
@@ -326,12 +352,47 @@ class StoryWindow(arcade.Window):
                 # Speak the line when fully faded in
                 self.speak_dialogue(self.scene.dialogue[self.current_line])
         elif self.fade_state == "display":
-            self.dialogue_timer += 1
-            if self.dialogue_timer >= DIALOGUE_DISPLAY_TIME:
+            self.dialogue_timer += delta_time
+            if self.dialogue_timer >= self._line_hold_time() and self._has_next_line():
                 self.fade_state = "fadeout"
         elif self.fade_state == "fadeout":
-            self.dialogue_alpha -= FADE_OUT_SPEED
+            self.dialogue_alpha -= delta_time / DIALOGUE_FADE_OUT_SECONDS
             if self.dialogue_alpha <= 0:
                 self.fade_state = "fadein"
                 self.dialogue_alpha = 0
-                self.current_line = (self.current_line + 1) % len(self.scene.dialogue)
\ No newline at end of file
+                self.current_line = (self.current_line + 1) % len(self.scene.dialogue)
+
+    def _has_next_line(self):
+        """Whether there is a line to move on to; the story only wraps once it has fully arrived"""
+        return self.dialogue_complete or self.current_line + 1 < len(self.scene.dialogue)
+
+    def _line_hold_time(self):
+        """Seconds to keep the current line on screen.
+
+        Spoken lines are held until their audio finishes (known from the
+        playback callback or the decoded clip length) plus a short tail;
+        unspoken lines use an estimate based on word count.
+        """
+        text = list(self.scene.dialogue[self.current_line].values())[0]
+        estimate = len(text.split()) / DIALOGUE_WORDS_PER_SECOND
+        speech = self.current_speech
+        if speech is None or speech.state in (SpeechHandle.FAILED, SpeechHandle.CANCELLED):
+            hold = estimate
+        elif speech.state == SpeechHandle.DONE and not speech.played:
+            # No audio output (none probed, or playback failed): the line was never heard
+            hold = estimate
+        elif self.speech_finished_at is not None:
+            hold = self.speech_finished_at + DIALOGUE_TAIL_SECONDS
+        elif speech.remaining() is not None:
+            hold = self.dialogue_timer + speech.remaining() + DIALOGUE_TAIL_SECONDS
+        elif speech.started_at is None and self.dialogue_timer >= TTS_START_TIMEOUT:
+            # Synthesis is stalled; give up on audio for this line
+            speech.cancel()
+            hold = estimate
+        else:
+            return float("inf")
+        return max(hold, DIALOGUE_MIN_DISPLAY_SECONDS)
+
+    def _on_speech_complete(self, handle):
+        if handle is self.current_speech and handle.state == SpeechHandle.DONE and handle.played:
+            self.speech_finished_at = self.dialogue_timer
@@ -0,0 +1,45 @@
+# test_audio_cache.py
+import os
+import threading
+from audio_cache import AudioCache
+
+
+def test_byte_budget_evicts_least_recently_used(tmp_path):
+    cache = AudioCache(cache_dir=str(tmp_path), max_bytes=30)
+    for key in "abc":
+        cache.put(key, key.encode() * 10)
+    assert cache.get("a") == b"a" * 10  # Now b is the least recently used
+    cache.put("d", b"d" * 10)
+    assert cache.get("b") is None
+    assert not os.path.exists(tmp_path / "b.wav")
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5, "entries": 3, "bytes": 30}
+
+
+def test_index_is_rebuilt_from_disk(tmp_path):
+    key = AudioCache.make_key("model", "Fritz-PlayAI", "Stand aside.", "wav")
+    assert key != AudioCache.make_key("model", "Fritz-PlayAI", "Stand aside.", "mp3")
+    AudioCache(cache_dir=str(tmp_path)).put(key, b"RIFF....")
+    (tmp_path / "stale.wav.123.tmp").write_bytes(b"partial")  # A write that never finished
+    cache = AudioCache(cache_dir=str(tmp_path))
+    assert cache.get(key) == b"RIFF...."
+    assert cache.stats()["entries"] == 1 and cache.stats()["bytes"] == 8
+
+
+def test_deleted_file_is_a_miss(tmp_path):
+    cache = AudioCache(cache_dir=str(tmp_path))
+    cache.put("a", b"audio")
+    os.remove(tmp_path / "a.wav")
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 0 and cache.stats()["bytes"] == 0
+
+
+def test_concurrent_puts_of_one_key(tmp_path):
+    cache = AudioCache(cache_dir=str(tmp_path))
+    threads = [threading.Thread(target=cache.put, args=("a", b"audio")) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert cache.get("a") == b"audio"
+    assert cache.stats()["entries"] == 1 and cache.stats()["bytes"] == 5
+    assert os.listdir(tmp_path) == ["a.wav"]
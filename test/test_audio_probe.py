@@ -0,0 +1,34 @@
+# test_audio_probe.py
+import subprocess
+import audio_probe
+from audio_probe import ffplay_command, ffplay_env
+
+
+def test_ffplay_device_is_chosen_through_sdl_env(monkeypatch):
+    monkeypatch.delenv("SDL_AUDIODRIVER", raising=False)
+    monkeypatch.delenv("AUDIODEV", raising=False)
+    assert "-ao" not in ffplay_command(volume=0.3)
+    assert ffplay_command(volume=0.3)[-3:] == ["-af", "volume=0.3", "-"]
+    assert "SDL_AUDIODRIVER" not in ffplay_env(None)
+
+    env = ffplay_env("pulseaudio")
+    assert env["SDL_AUDIODRIVER"] == "pulseaudio" and "AUDIODEV" not in env
+    env = ffplay_env("alsa:hw:1,0")
+    assert env["SDL_AUDIODRIVER"] == "alsa" and env["AUDIODEV"] == "hw:1,0"
+
+
+def test_probe_runs_ffplay_with_each_device_env(monkeypatch):
+    calls = []
+
+    def run(cmd, env=None, **kwargs):
+        calls.append((cmd, env.get("SDL_AUDIODRIVER")))
+        return subprocess.CompletedProcess(cmd, 0 if env.get("SDL_AUDIODRIVER") == "alsa" else 1)
+
+    monkeypatch.delenv("SDL_AUDIODRIVER", raising=False)
+    monkeypatch.setattr(audio_probe, "_probe_pyglet", lambda: False)
+    monkeypatch.setattr(audio_probe.shutil, "which", lambda name: "/usr/bin/ffplay")
+    monkeypatch.setattr(audio_probe.subprocess, "run", run)
+    monkeypatch.setattr(audio_probe, "TTS_AUDIO_DEVICES", ["pulseaudio", "alsa"])
+    assert audio_probe.probe_audio_backend() == {"backend": "ffplay", "device": "alsa"}
+    assert [driver for _, driver in calls] == [None, "pulseaudio", "alsa"]
+    assert all(cmd == ffplay_command(volume=0) for cmd, _ in calls)
@@ -0,0 +1,54 @@
+# test_hedging.py
+import asyncio
+import time
+import httpx
+from hedging import LatencyTracker, hedged
+
+
+def completion(server):
+    """Coroutine function posting one chat completion to a mock server"""
+    async def call():
+        async with httpx.AsyncClient() as client:
+            resp = await client.post(f"{server.url}/openai/v1/chat/completions", json={
+                "model": "mock", "messages": [{"role": "user", "content": "forest"}], "max_tokens": 50
+            })
+            resp.raise_for_status()
+            return resp.json()["choices"][0]["message"]["content"]
+    return call
+
+
+def test_slow_primary_is_hedged_and_recorded_as_censored(mock_groq):
+    slow = mock_groq(latency="fixed", latency_mean=2.0)
+    fast = mock_groq(latency="fixed", latency_mean=0.05)
+    tracker = LatencyTracker(min_samples=1)
+
+    started = time.monotonic()
+    content, winner = asyncio.run(hedged(completion(slow), completion(fast), 0.2, tracker=tracker))
+
+    assert winner == "backup"
+    assert content
+    assert time.monotonic() - started < 1.5
+    # The cancelled primary counts as at least the deadline, never the backup's ~0.05s
+    assert tracker.deadline() >= 0.2
+
+
+def test_fast_primary_wins_and_records_its_latency(mock_groq):
+    server = mock_groq(latency="fixed", latency_mean=0.1)
+    tracker = LatencyTracker(min_samples=1)
+
+    content, winner = asyncio.run(hedged(completion(server), completion(server), 1.0, tracker=tracker))
+
+    assert winner == "primary"
+    assert server.stats()["requests"] == 1
+    assert 0.1 <= tracker.deadline() < 1.0
+
+
+def test_deadline_does_not_ratchet_down(mock_groq):
+    slow = mock_groq(latency="fixed", latency_mean=0.6)
+    fast = mock_groq(latency="fixed", latency_mean=0.0)
+    tracker = LatencyTracker(percentile=50, min_samples=3, default=0.3)
+
+    for _ in range(5):
+        asyncio.run(hedged(completion(slow), completion(fast), tracker.deadline(), tracker=tracker))
+
+    assert tracker.deadline() >= 0.3
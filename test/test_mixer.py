@@ -0,0 +1,86 @@
+# test_mixer.py
+import struct
+import numpy as np
+import pyglet
+
+pyglet.options["shadow_window"] = False  # Runs without a display (silent audio driver)
+
+from pyglet.media.drivers.base import AbstractAudioPlayer
+from mixer import BufferChannel, Mixer, StreamChannel
+
+
+def pcm(values):
+    return struct.pack(f"<{len(values)}h", *values)
+
+
+def wav_header(frames, rate=44100):
+    """Header of a 16-bit mono WAV at the mixer's rate, so samples pass through unchanged"""
+    data_size = frames * 2
+    return (b"RIFF" + struct.pack("<I", 36 + data_size) + b"WAVE"
+            + b"fmt " + struct.pack("<IHHIIHH", 16, 1, 1, rate, rate * 2, 2, 16)
+            + b"data" + struct.pack("<I", data_size))
+
+
+class FakePlayer:
+    """Stands in for the output player; time is how much audio has been heard"""
+
+    time = 0.0
+
+
+def test_output_player_buffers_a_few_blocks_not_the_pyglet_default():
+    mixer = Mixer()
+    mixer.start()
+    try:
+        ideal = mixer.player._audio_player._buffered_data_ideal_size
+        assert ideal < mixer.source.audio_format.timestamp_to_bytes_aligned(0.9)
+        assert AbstractAudioPlayer.audio_buffer_length == 0.9  # Other players keep the default
+    finally:
+        mixer.stop()
+
+
+def test_channel_finishes_when_heard_not_when_rendered():
+    mixer = Mixer(block_frames=100)
+    mixer.player = FakePlayer()
+    channel = mixer._add("voice", BufferChannel(np.ones((150, 2), dtype=np.float32)))
+
+    mixer.source.get_audio_data(400)
+    mixer.source.get_audio_data(400)  # Renders the last 50 frames
+    assert channel.ended and channel.playing
+    assert not mixer._channels["voice"]
+
+    mixer.player.time = 140 / mixer.sample_rate
+    mixer.source.get_audio_data(400)
+    assert channel.playing
+    mixer.player.time = 160 / mixer.sample_rate
+    mixer.source.get_audio_data(400)
+    assert not channel.playing
+
+
+def test_music_ducks_only_while_voice_renders():
+    mixer = Mixer(block_frames=100, duck_seconds=0.0, gains={"music": 1.0, "sfx": 1.0, "voice": 0.0})
+    mixer.player = FakePlayer()
+    mixer._add("music", BufferChannel(np.full((100, 2), 0.5, dtype=np.float32), loop=True))
+    mixer._add("voice", BufferChannel(np.ones((50, 2), dtype=np.float32)))
+
+    def level():
+        data = mixer.source.get_audio_data(400).data
+        return np.frombuffer(data, dtype=np.int16)[-1] / 32767
+
+    assert abs(level() - 0.5 * mixer.duck_gain) < 1e-3
+    assert abs(level() - 0.5) < 1e-3  # Voice has ended (though not yet heard)
+
+
+def test_stream_channel_reads_across_fed_chunks():
+    channel = StreamChannel()
+    header = wav_header(frames=10)
+    assert not channel.feed(header[:20])
+    assert channel.feed(header[20:] + pcm(range(0, 3)))
+    channel.feed(pcm(range(3, 7)))
+    channel.feed(pcm(range(7, 10))[:-1])  # Last frame split across chunks
+    channel.feed(pcm(range(7, 10))[-1:])
+
+    assert [round(v * 32768) for v in channel.read(5)[:, 0]] == [0, 1, 2, 3, 4]
+    assert [round(v * 32768) for v in channel.read(4)[:, 0]] == [5, 6, 7, 8]
+    assert len(channel.read(4)) == 4  # Underrun is padded with silence until finish()
+    channel.finish()
+    assert len(channel.read(4)) == 0
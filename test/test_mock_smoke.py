@@ -0,0 +1,75 @@
+# test_mock_smoke.py
+"""End-to-end smoke test of the story path against the mock Groq server"""
+import time
+import pytest
+import groq_client
+import rate_limiter
+import story_fetcher
+from hedging import LatencyTracker
+from story_cache import StoryCache
+
+
+@pytest.fixture
+def groq_mock(monkeypatch, tmp_path, mock_groq):
+    """Point the shared Groq clients at a fresh mock server; returns a starter like mock_groq"""
+
+    def start(**options):
+        server = mock_groq(**options)
+        monkeypatch.setenv("GROQ_BASE_URL", server.url)
+        monkeypatch.setenv("GROQ_API_KEY", "mock")
+        monkeypatch.setattr(groq_client, "_client", None)
+        monkeypatch.setattr(groq_client, "_async_client", None)
+        monkeypatch.setattr(rate_limiter, "_limiters", {})
+        monkeypatch.setattr(story_fetcher, "_cache", StoryCache(str(tmp_path / "stories.db")))
+        return server
+
+    return start
+
+
+def story(prompt, **options):
+    return story_fetcher.get_groq_story(prompt=prompt, fallback=False, decomposed=False, reuse_cache=False,
+                                        backend="groq", **{"hedge": False, **options})
+
+
+def test_requests_share_one_keep_alive_connection(groq_mock):
+    server = groq_mock(latency_mean=0.0)
+    for index in range(4):
+        dialogue, _, _ = story(f"A duel at dawn, take {index}")
+        assert dialogue
+    stats = server.stats()
+    assert stats["requests"] == 4
+    assert stats["connections"] == 1
+
+
+def test_slow_primary_is_hedged_and_only_its_latency_recorded(groq_mock, monkeypatch):
+    server = groq_mock(latency_mean=0.5)
+    tracker = LatencyTracker(default=0.1, min_samples=1000)  # Hedge after 0.1 s
+    monkeypatch.setattr(story_fetcher, "_latency", tracker)
+    monkeypatch.setattr(story_fetcher, "STORY_HEDGE_BACKEND", "template")
+
+    dialogue, _, _ = story("A chase through the ruins", hedge=True)
+    assert dialogue
+    assert server.stats()["requests"] == 1   # The primary, cancelled once the offline backup won
+    assert len(tracker._samples) == 1 and 0.1 <= tracker._samples[0] < 0.5  # Censored, not the backup's time
+    assert story_fetcher._get_cache().stats()["entries"] == 0  # The backup's story is not cached
+
+
+def test_rate_limited_requests_back_off_and_succeed(groq_mock):
+    server = groq_mock(latency_mean=0.0, rate_limit_rate=0.4, retry_after=0.2, seed=3)
+    start = time.monotonic()
+    for index in range(4):
+        dialogue, _, _ = story(f"A storm over the keep, take {index}")
+        assert dialogue
+    elapsed = time.monotonic() - start
+    stats = server.stats()
+    assert stats["status_429"] > 0 and stats["status_200"] == 4
+    # Each 429 costs its Retry-After once, not again in the limiter's buckets
+    assert elapsed < 0.2 * stats["status_429"] + 1.0
+
+
+def test_story_streams_without_json_mode(groq_mock):
+    server = groq_mock(latency_mean=0.0)
+    events = list(story_fetcher.stream_groq_story(prompt="A duel on the bridge", reuse_cache=False, backend="groq"))
+    assert [section for section, _ in events].count("dialogue") > 0
+    assert server.stats().get("status_400", 0) == 0
+    assert story_fetcher._get_cache().stats()["entries"] == 1
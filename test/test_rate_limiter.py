@@ -0,0 +1,42 @@
+# test_rate_limiter.py
+import time
+import groq
+import httpx
+from rate_limiter import RateLimiter, call_with_retry
+
+
+def rate_limit_error(retry_after):
+    request = httpx.Request("POST", "http://mock/openai/v1/chat/completions")
+    response = httpx.Response(429, headers={"retry-after": str(retry_after)}, request=request)
+    return groq.RateLimitError("Rate limit reached", response=response, body=None)
+
+
+def test_pause_is_waited_once_not_added_to_the_bucket():
+    limiter = RateLimiter(requests_per_minute=60)
+    limiter.requests.tokens = 0.0  # Quota used up: the next request is due in 1 s
+    limiter.pause(0.5)
+    start = time.monotonic()
+    limiter.acquire()
+    assert 0.9 <= time.monotonic() - start < 1.2  # Not 1.5: the pause ran within the bucket's wait
+    limiter.pause(0.5)
+    start = time.monotonic()
+    limiter.acquire()
+    assert 0.9 <= time.monotonic() - start < 1.2
+
+
+def test_retries_wait_out_the_pause_without_charging_again():
+    limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=600)
+    attempts = []
+
+    def request():
+        attempts.append(time.monotonic())
+        if len(attempts) < 3:
+            raise rate_limit_error(0.2)
+        return "ok"
+
+    start = time.monotonic()
+    assert call_with_retry(request, limiter, tokens=100) == "ok"
+    assert len(attempts) == 3
+    assert 0.4 <= time.monotonic() - start < 0.8  # Two Retry-After waits, no per-retry bucket charge
+    assert limiter.requests.tokens >= 58  # One request charged
+    assert 490 <= limiter.tokens.tokens <= 510
@@ -0,0 +1,86 @@
+# test_salvage.py
+import json
+import groq
+import httpx
+import pytest
+import story_fetcher
+from story_cache import StoryCache
+
+DIALOGUE = [{"speaker": "hero", "text": "Stand aside."}, {"speaker": "villain", "text": "Never."}]
+INSTRUCTIONS = [{"character": "hero", "action": "walk", "duration": 2, "direction": "right"},
+                {"character": "villain", "action": "idle", "duration": 1}]
+
+
+def truncated(document, cut):
+    text = json.dumps(document)
+    return text[:text.index(cut)]
+
+
+def json_validate_failed(partial):
+    request = httpx.Request("POST", "http://mock/openai/v1/chat/completions")
+    error = {"message": "Failed to generate JSON", "code": "json_validate_failed", "failed_generation": partial}
+    return groq.BadRequestError("Failed to generate JSON", response=httpx.Response(400, request=request),
+                                body={"error": error})
+
+
+class ScriptedBackend:
+    name = model = "scripted"
+    requires_api_key = False
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+
+    def complete(self, messages, max_tokens, temperature):
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+
+@pytest.fixture(autouse=True)
+def fresh_stats(monkeypatch, tmp_path):
+    monkeypatch.setattr(story_fetcher, "SALVAGE_STATS", {"salvaged": 0, "lost": 0, "rerequested": 0})
+    monkeypatch.setattr(story_fetcher, "_cache", StoryCache(str(tmp_path / "stories.db")))
+
+
+def test_truncated_rerequest_keeps_its_complete_elements():
+    # The story lost its instructions; the re-request is cut off in its second element too
+    story = truncated({"dialogue": DIALOGUE, "instructions": INSTRUCTIONS}, '"instructions"')
+    backend = ScriptedBackend(
+        json_validate_failed(truncated({"instructions": INSTRUCTIONS}, '"character": "villain"')),
+        json.dumps({"music": [{"action": "play", "track": "adventure"}]})
+    )
+    response = story_fetcher._salvage_response(story, "a duel", 0.7, False, backend)
+    assert response["dialogue"] == DIALOGUE
+    assert response["instructions"] == INSTRUCTIONS[:1]
+    assert story_fetcher.SALVAGE_STATS == {"salvaged": 3, "lost": 1, "rerequested": 2}
+
+
+def test_truncated_section_request_is_salvaged():
+    backend = ScriptedBackend(truncated({"dialogue": DIALOGUE}, '{"speaker": "villain"'))
+    assert story_fetcher.generate_section("dialogue", "a duel", reuse_cache=False, backend=backend) == [
+        {"hero": "Stand aside."}
+    ]
+
+
+class SectionBackend(ScriptedBackend):
+    """Answers by section; a section mapped to an exception fails"""
+
+    def __init__(self, **sections):
+        self.sections = sections
+
+    def complete(self, messages, max_tokens, temperature):
+        for section, reply in self.sections.items():
+            if messages[0]["content"] == story_fetcher.SECTION_PROMPTS[section]:
+                if isinstance(reply, Exception):
+                    raise reply
+                return json.dumps({section: reply})
+        raise AssertionError("Unexpected request")
+
+
+def test_failed_music_or_instructions_keep_the_dialogue():
+    backend = SectionBackend(dialogue=DIALOGUE, instructions=RuntimeError("boom"), music=RuntimeError("boom"))
+    story, instructions, music = story_fetcher.get_groq_story(
+        prompt="a duel", decomposed=True, hedge=False, reuse_cache=False, fallback=False, backend=backend)
+    assert story == [{"hero": "Stand aside."}, {"villain": "Never."}]
+    assert instructions == [] and music == []
@@ -0,0 +1,101 @@
+# test_sfx_pool.py
+import io
+import time
+import wave
+import pyglet
+
+pyglet.options["shadow_window"] = False  # Runs without a display (silent audio driver)
+
+import resource_bank
+from mixer import Mixer
+from resource_bank import ResourceBank
+from sfx_pool import SFXPool
+
+
+class FakeSound:
+    """Just the part of arcade.Sound the pool uses"""
+
+    def __init__(self, frames, rate=22050):
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(rate)
+            wav.writeframes(b"\x01\x00" * frames)
+        self.source = pyglet.media.load("sfx.wav", file=io.BytesIO(buffer.getvalue()), streaming=False)
+
+
+def run_clock(seconds):
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        pyglet.app.platform_event_loop.dispatch_posted_events()
+        pyglet.clock.tick()
+        time.sleep(0.01)
+
+
+def make_pool(monkeypatch, voices):
+    sounds = {"hurt1": FakeSound(2205), "hit1": FakeSound(2205)}
+    monkeypatch.setattr(ResourceBank, "_sound_cache", sounds)
+    monkeypatch.setattr(ResourceBank, "SOUNDS", {name: "" for name in sounds})
+    monkeypatch.setattr("sfx_pool.get_mixer", lambda: None)
+    return SFXPool(voices=voices, cooldown=0.0)
+
+
+def test_driver_players_survive_end_of_stream_and_swaps(monkeypatch):
+    pool = make_pool(monkeypatch, voices=1)
+    assert pool.play("hurt1")
+    driver_player = pool._players[0]._audio_player
+
+    run_clock(1.0)  # Let the effect reach end of stream
+    assert not pool._players[0].playing
+    assert pool._players[0]._audio_player is driver_player
+
+    assert pool.play("hit1")
+    assert pool.play("hurt1")  # Steals the only voice
+    assert pool.stolen == 1
+    assert pool._players[0]._audio_player is driver_player
+
+
+def test_cooldown_skips_rapid_retriggers(monkeypatch):
+    pool = make_pool(monkeypatch, voices=4)
+    pool.cooldown = 10.0
+    assert pool.play("hurt1")
+    assert not pool.play("hurt1")
+    assert pool.skipped == 1
+
+
+class FakeMusic:
+    """A streaming track; each one opened is a fresh stream at its start"""
+
+    opened = 0
+
+    def __init__(self, path, streaming=True):
+        FakeMusic.opened += 1
+        self.stopped = []
+
+    def stop(self, player):
+        self.stopped.append(player)
+
+
+def test_warm_up_decodes_effects_and_rewinds_released_tracks(monkeypatch):
+    make_pool(monkeypatch, voices=1)
+    mixer = Mixer()
+    monkeypatch.setattr(resource_bank, "get_mixer", lambda: mixer)
+    ResourceBank.warm_up([{"action": "hurt"}], [])
+    assert ResourceBank.get_sound("hurt1").source in mixer._decoded  # Not decoded on first play
+
+    monkeypatch.setattr(ResourceBank, "_music_cache", {})
+    monkeypatch.setattr(ResourceBank, "_music_played", set())
+    monkeypatch.setattr(resource_bank.arcade, "Sound", FakeMusic)
+    monkeypatch.setattr(FakeMusic, "opened", 0)
+    cue = {"action": "play", "track": "adventure"}
+    ResourceBank.warm_up([], [cue])
+    track = ResourceBank.get_music("adventure")
+    ResourceBank.warm_up([], [cue])
+    assert ResourceBank.get_music("adventure") is track  # Never played: kept as is
+
+    ResourceBank.release_music("adventure", "player")
+    assert track.stopped == ["player"]
+    assert ResourceBank.get_music("adventure") is track  # The frame thread never reopens it
+    ResourceBank.warm_up([], [cue])
+    assert ResourceBank.get_music("adventure") is not track and FakeMusic.opened == 2
@@ -0,0 +1,77 @@
+# test_singleflight.py
+import threading
+import time
+import pytest
+from singleflight import SingleFlight
+
+
+def wait_for(condition, timeout=5.0):
+    end = time.monotonic() + timeout
+    while not condition() and time.monotonic() < end:
+        time.sleep(0.01)
+    return condition()
+
+
+def run_together(flight, key, fn, callers=5):
+    """Start callers for key while the leader's call is held open; returns (results, errors)"""
+    results, errors = [], []
+
+    def call():
+        try:
+            results.append(flight.do(key, fn))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(callers)]
+    threads[0].start()
+    assert wait_for(lambda: flight.in_flight(key) is not None)
+    for thread in threads[1:]:
+        thread.start()
+    return threads, results, errors
+
+
+def test_concurrent_callers_share_one_result():
+    flight = SingleFlight()
+    release = threading.Event()
+    runs = []
+
+    def fetch():
+        runs.append(1)
+        release.wait(5)
+        return "story"
+
+    threads, results, errors = run_together(flight, "a duel", fetch)
+    assert wait_for(lambda: flight.stats()["calls"] == 5)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert results == ["story"] * 5 and errors == []
+    assert len(runs) == 1
+    assert flight.stats() == {"calls": 5, "shared": 4, "in_flight": 0}
+
+
+def test_concurrent_callers_share_one_exception():
+    flight = SingleFlight()
+    release = threading.Event()
+    failure = RuntimeError("rate limited")
+
+    def fetch():
+        release.wait(5)
+        raise failure
+
+    threads, results, errors = run_together(flight, "a duel", fetch)
+    assert wait_for(lambda: flight.stats()["calls"] == 5)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert results == [] and errors == [failure] * 5
+
+
+def test_finished_calls_are_not_remembered():
+    flight = SingleFlight()
+    assert flight.do("a", lambda: 1) == 1
+    assert flight.do("a", lambda: 2) == 2  # Deduplicates bursts, not repeats
+    with pytest.raises(ValueError):
+        flight.do("a", int, "not a number")
+    assert flight.in_flight("a") is None
+    assert flight.stats() == {"calls": 3, "shared": 0, "in_flight": 0}
@@ -0,0 +1,71 @@
+# test_story_cache.py
+import threading
+import story_cache
+from story_cache import StoryCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+def make_cache(monkeypatch, tmp_path, **options):
+    clock = FakeClock()
+    monkeypatch.setattr(story_cache.time, "time", clock.time)
+    return StoryCache(str(tmp_path / "stories.db"), **options), clock
+
+
+def test_entries_expire_after_ttl(monkeypatch, tmp_path):
+    cache, clock = make_cache(monkeypatch, tmp_path, ttl=60, max_bytes=1 << 20)
+    cache.put("a", "story a")
+    clock.now += 59
+    assert cache.get("a") == "story a"  # Reading does not extend the TTL
+    clock.now += 2
+    assert cache.get("a") is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "entries": 0, "bytes": 0}
+
+
+def test_byte_budget_evicts_least_recently_used(monkeypatch, tmp_path):
+    cache, clock = make_cache(monkeypatch, tmp_path, ttl=3600, max_bytes=30)
+    for key in "abc":
+        cache.put(key, key * 10)
+        clock.now += 1
+    assert cache.get("a") == "a" * 10  # Now b is the least recently used
+    clock.now += 1
+    cache.put("d", "d" * 10)
+    assert cache.get("b") is None
+    assert [cache.get(key) for key in "acd"] == ["a" * 10, "c" * 10, "d" * 10]
+    assert cache.stats() == {"hits": 4, "misses": 1, "entries": 3, "bytes": 30}
+
+
+def test_entries_survive_reopening(tmp_path):
+    path = str(tmp_path / "stories.db")
+    key = StoryCache.make_key("model", "system", "a duel", 1000, 0.7)
+    assert key != StoryCache.make_key("model", "system", "a duel", 1000, 0.8)
+    StoryCache(path).put(key, "story")
+    assert StoryCache(path).get(key) == "story"
+
+
+def test_concurrent_writers_and_readers(tmp_path):
+    cache = StoryCache(str(tmp_path / "stories.db"), ttl=3600, max_bytes=1 << 20)
+    errors = []
+
+    def work(worker):
+        try:
+            for index in range(20):
+                key = f"{worker}-{index}"
+                cache.put(key, key)
+                assert cache.get(key) == key
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=work, args=(worker,)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert cache.stats()["entries"] == 80 and cache.stats()["hits"] == 80
@@ -0,0 +1,51 @@
+# test_story_pool.py
+import time
+import story_pool
+from story_pool import StoryPool
+
+STORY = ([{"hero": "Hello"}], [], [])
+
+
+def wait_for(condition, timeout=5.0):
+    end = time.monotonic() + timeout
+    while not condition() and time.monotonic() < end:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_failed_refill_is_retried_with_backoff(monkeypatch):
+    calls = []
+
+    def flaky(prompt=None, fallback=True):
+        calls.append(time.monotonic())
+        if len(calls) < 3:
+            raise RuntimeError("upstream unavailable")
+        return STORY
+
+    monkeypatch.setattr(story_pool, "get_groq_story", flaky)
+    monkeypatch.setattr(story_pool, "warm_story", lambda result: result)
+    monkeypatch.setattr(story_pool, "backoff_delay", lambda attempt, error=None: 0.05 * 2 ** attempt)
+    pool = StoryPool(size=1, concurrency=1, retries=3)
+    try:
+        assert wait_for(lambda: pool.depth == 1)
+        metrics = pool.metrics()
+        assert metrics["retries"] == 2 and metrics["failures"] == 0
+        assert calls[2] - calls[1] >= 0.1 > calls[1] - calls[0] >= 0.05
+        assert pool.next_story() == STORY
+        assert pool.metrics()["hits"] == 1
+    finally:
+        pool.shutdown()
+
+
+def test_refill_gives_up_after_its_retries(monkeypatch):
+    def failing(prompt=None, fallback=True):
+        raise RuntimeError("upstream unavailable")
+
+    monkeypatch.setattr(story_pool, "get_groq_story", failing)
+    monkeypatch.setattr(story_pool, "backoff_delay", lambda attempt, error=None: 0.0)
+    pool = StoryPool(size=1, concurrency=1, retries=2)
+    try:
+        assert wait_for(lambda: pool.metrics()["failures"] == 1)
+        assert pool.metrics()["retries"] == 2 and pool.metrics()["in_flight"] == 0
+    finally:
+        pool.shutdown()
@@ -0,0 +1,31 @@
+# test_story_stream.py
+import json
+from story_stream import StoryStreamParser
+
+DOCUMENT = json.dumps({
+    "dialogue": [{"hero": "A brace } and \"quote\" in a line"}, {"villain": "Then [come]!"}],
+    "instructions": [{"character": "hero", "action": "walk"}],
+    "music": []
+})
+
+
+def test_elements_are_emitted_across_arbitrary_chunk_boundaries():
+    for size in (1, 3, 7, len(DOCUMENT)):
+        parser = StoryStreamParser()
+        elements = []
+        for start in range(0, len(DOCUMENT), size):
+            elements += parser.feed(DOCUMENT[start:start + size])
+        assert elements == [
+            ("dialogue", {"hero": "A brace } and \"quote\" in a line"}),
+            ("dialogue", {"villain": "Then [come]!"}),
+            ("instructions", {"character": "hero", "action": "walk"})
+        ]
+        assert parser.complete and parser.text == DOCUMENT
+
+
+def test_only_the_unfinished_element_is_kept_for_rescanning():
+    parser = StoryStreamParser()
+    cut = DOCUMENT.index("Then")
+    parser.feed(DOCUMENT[:cut])
+    assert parser.pending_element
+    assert len(parser._window) < 20
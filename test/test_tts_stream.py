@@ -0,0 +1,86 @@
+# test_tts_stream.py
+import threading
+import time
+import groq
+import pyglet
+
+pyglet.options["shadow_window"] = False  # Runs without a display (silent audio driver)
+
+import tts_controller
+from audio_cache import AudioCache
+from audio_player import StreamingWavSource
+from mock_groq_server import speech_wav
+from tts_controller import TTSController
+
+LINE = "I can feel you."
+
+
+def make_controller(monkeypatch, tmp_path, server=None):
+    client = groq.Groq(api_key="mock", base_url=server.url if server else "http://127.0.0.1:9", max_retries=0)
+    monkeypatch.setattr(tts_controller, "get_groq_client", lambda: client)
+    monkeypatch.setattr(tts_controller, "get_audio_backend", lambda: {"backend": "pyglet", "device": None})
+    monkeypatch.setattr(tts_controller, "get_mixer", lambda: None)
+    return TTSController(cache=AudioCache(cache_dir=str(tmp_path)))
+
+
+def pump_until(thread, timeout):
+    end = time.monotonic() + timeout
+    while thread.is_alive() and time.monotonic() < end:
+        pyglet.app.platform_event_loop.dispatch_posted_events()
+        pyglet.clock.tick()
+        time.sleep(0.005)
+
+
+def test_underrun_returns_silence_without_blocking():
+    source = StreamingWavSource()
+    source.feed(speech_wav(LINE)[:44])  # Header only, no samples yet
+    start = time.monotonic()
+    audio_data = source.get_audio_data(4096)
+    assert time.monotonic() - start < 0.01
+    assert audio_data.length > 0 and not any(audio_data.data)
+
+
+def test_slow_trickle_plays_through_and_is_cached(monkeypatch, tmp_path, mock_groq):
+    # Speech arrives at half real time, so playback keeps running dry
+    server = mock_groq(token_delay=0.01, chunk_size=2400, speech_speed=0.5)
+    controller = make_controller(monkeypatch, tmp_path, server)
+    result = {}
+
+    def speak():
+        result["played"] = controller.play_stream(controller.stream("hero", LINE))
+
+    worker = threading.Thread(target=speak)
+    start = time.monotonic()
+    worker.start()
+    pump_until(worker, timeout=20)
+    assert result.get("played") is True
+    assert time.monotonic() - start >= 2 * len(LINE.split()) / 2.5 * 0.9  # Delivery took twice the clip
+    _, key = controller._voice_and_key("hero", LINE)
+    assert controller.cache.get(key) == speech_wav(LINE)
+
+
+def test_ffplay_fallback_only_before_the_format_is_known(monkeypatch, tmp_path):
+    controller = make_controller(monkeypatch, tmp_path)
+    audio = speech_wav("Then come find me")
+    replayed = []
+    monkeypatch.setattr(controller, "_play_with_ffplay",
+                        lambda chunks, device=None, on_start=None: replayed.append(b"".join(chunks)) or True)
+
+    class FailingPlayer:
+        def __init__(self, fail_after):
+            self.fail_after = fail_after
+
+        def play_stream(self, chunks, on_start=None):
+            for index, _ in enumerate(chunks):
+                if index == self.fail_after:
+                    raise RuntimeError("audio device lost")
+
+    chunks = [audio[:20], audio[20:1000], audio[1000:]]
+    controller.audio_player = FailingPlayer(fail_after=0)  # Only part of the header was read
+    assert controller.play_stream(iter(chunks))
+    assert replayed == [audio]
+
+    replayed.clear()
+    controller.audio_player = FailingPlayer(fail_after=1)  # Samples were already playing
+    assert controller.play_stream(iter(chunks))
+    assert replayed == []
@@ -0,0 +1,86 @@
+# test_tts_worker.py
+import threading
+import time
+import pyglet
+
+pyglet.options["shadow_window"] = False  # Runs without a display (silent audio driver)
+
+from mock_groq_server import SPEECH_SAMPLE_RATE, speech_wav
+from tts_worker import ScenePrefetcher, SpeechHandle, TTSWorker
+
+LINE = "Then come find me."
+
+
+class SlowStreamController:
+    """Stream opens only after release is set, like a request stuck behind a rate limit"""
+
+    audio_backend = {"backend": "pyglet", "device": None}
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def stream(self, character, text):
+        self.release.wait(5)
+        audio = speech_wav(text)
+        yield audio[:100]
+        yield audio[100:]
+
+    def play_stream(self, chunks, on_start=None):
+        on_start(self)  # Players report the playback object before reading the stream
+        for _ in chunks:
+            pass
+        return True
+
+    def terminate(self):
+        pass
+
+
+def wait_for(condition, timeout=5.0):
+    end = time.monotonic() + timeout
+    while not condition() and time.monotonic() < end:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_streamed_line_starts_when_audio_arrives_not_when_requested(monkeypatch):
+    monkeypatch.setattr("tts_worker.TTS_STREAMING", True)
+    controller = SlowStreamController()
+    worker = TTSWorker(controller)
+    try:
+        handle = worker.speak("hero", LINE)
+        assert wait_for(lambda: handle.state == SpeechHandle.PLAYING)
+        time.sleep(0.1)
+        assert handle.started_at is None  # Still waiting on the request: the start timeout can fire
+        controller.release.set()
+        assert wait_for(lambda: handle.state == SpeechHandle.DONE)
+        assert handle.started_at is not None
+        assert abs(handle.duration - len(speech_wav(LINE)[44:]) / (2 * SPEECH_SAMPLE_RATE)) < 1e-6
+    finally:
+        worker.shutdown()
+
+
+class RecordingController:
+    def __init__(self):
+        self.synthesized = []
+        self._lock = threading.Lock()
+
+    def synthesize(self, character, text):
+        with self._lock:
+            self.synthesized.append(text)
+        return speech_wav(text)
+
+
+def test_prefetcher_leaves_the_current_and_next_line_to_the_stream():
+    dialogue = [{"hero": f"Line {index}"} for index in range(6)]
+    controller = RecordingController()
+    prefetcher = ScenePrefetcher(controller, dialogue, lookahead=3, stream_ahead=2)
+    try:
+        assert prefetcher.get(0) is None and prefetcher.get(1) is None
+        assert prefetcher.get(2).result() == speech_wav("Line 2")  # Moved the window to line 2
+        # Clips leaving the memory window may be fetched again (from the disk cache); lines 0 and 1 never are
+        assert wait_for(lambda: set(controller.synthesized) == {"Line 2", "Line 3", "Line 4", "Line 5"})
+        dialogue.append({"hero": "Line 6"})
+        prefetcher.advance(5)
+        assert prefetcher.prefetch(6) is None  # The next line after 5 is streamed
+    finally:
+        prefetcher.shutdown()
@@ -1,62 +1,193 @@
 # tts_controller.py
-import os
+import itertools
 import subprocess
-from groq import Groq
-from dotenv import load_dotenv
+from audio_cache import AudioCache
+from audio_player import AudioPlayer, parse_wav_header
+from audio_probe import ffplay_command, ffplay_env, get_audio_backend
+from groq_client import get_groq_client
+from mixer import get_mixer
+from rate_limiter import call_with_retry, get_rate_limiter
+from settings import TTS_STREAM_CHUNK_BYTES, TTS_STREAMING, TTS_VOLUME
+from singleflight import SingleFlight
+
+def speech_tokens(text):
+    """Rough token cost of a line for the speech tokens-per-minute bucket (~4 chars per token)"""
+    return max(1, len(text) // 4)
 
-load_dotenv()
 
 class TTSController:
-    def __init__(self):
-        self.client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
+    def __init__(self, cache=None):
+        self.client = get_groq_client()
+        self.model = "playai-tts"
+        self.response_format = "wav"
+        self.cache = cache if cache is not None else AudioCache()
+        # The same line requested again before its synthesis finishes waits for that one
+        self._inflight = SingleFlight()
         self.voice_map = {
             "hero": "Aaliyah-PlayAI",
             "villain": "Angelo-PlayAI",
             "narrator": "Atlas-PlayAI"
         }
-        # Try different audio devices in order of likelihood
-        self.audio_devices = ["default", "pulse", "alsa", "sdl", "openal"]
+        # Probed once per process (and cached per host) instead of per line
+        self.audio_backend = get_audio_backend()
+        mixer = get_mixer() if self.audio_backend["backend"] == "pyglet" else None
+        self.audio_player = AudioPlayer(mixer=mixer)
 
-    def speak_line(self, character, text):
-        if character not in self.voice_map:
-            character = "narrator"
-            
-        try:
-            response = self.client.audio.speech.create(
-                model="playai-tts",
-                voice=self.voice_map[character],
+    def _voice_and_key(self, character, text):
+        voice = self.voice_map.get(character, self.voice_map["narrator"])
+        return voice, AudioCache.make_key(self.model, voice, text, self.response_format)
+
+    def synthesize(self, character, text):
+        """Fetch WAV bytes for a line of dialogue, served from the cache when possible"""
+        voice, key = self._voice_and_key(character, text)
+        audio_data = self.cache.get(key)
+        if audio_data is not None:
+            return audio_data
+        return self._inflight.do(key, self._fetch_speech, voice, text, key)
+
+    def _fetch_speech(self, voice, text, key):
+        audio_data = self.cache.get(key)
+        if audio_data is not None:
+            return audio_data  # Another flight finished between our cache check and now
+        response = call_with_retry(
+            lambda: self.client.audio.speech.create(
+                model=self.model,
+                voice=voice,
                 input=text,
-                response_format="wav"
+                response_format=self.response_format
+            ),
+            limiter=get_rate_limiter("speech"),
+            tokens=speech_tokens(text)
+        )
+        audio_data = response.read()
+        self.cache.put(key, audio_data, extension=self.response_format)
+        return audio_data
+
+    def stream(self, character, text, chunk_size=TTS_STREAM_CHUNK_BYTES):
+        """Yield WAV bytes for a line as they arrive from the speech API.
+
+        Cache hits are yielded in one piece, as is a line whose synthesis is
+        already in flight (e.g. from the prefetcher) once it lands; a stream
+        that completes is written to the cache so the next request for the
+        line is a file read.
+        """
+        voice, key = self._voice_and_key(character, text)
+        audio_data = self.cache.get(key)
+        if audio_data is None:
+            in_flight = self._inflight.in_flight(key)
+            if in_flight is not None:
+                try:
+                    audio_data = in_flight.result()
+                except Exception:
+                    pass  # That request failed; try our own stream below
+        if audio_data is not None:
+            yield audio_data
+            return
+
+        def open_stream():
+            # The request is sent when the streaming context is entered
+            manager = self.client.audio.speech.with_streaming_response.create(
+                model=self.model,
+                voice=voice,
+                input=text,
+                response_format=self.response_format
             )
-            
-            audio_data = response.read()
-            
-            # First try without specifying audio device
+            return manager, manager.__enter__()
+
+        manager, response = call_with_retry(
+            open_stream, limiter=get_rate_limiter("speech"), tokens=speech_tokens(text)
+        )
+        chunks = []
+        try:
+            for chunk in response.iter_bytes(chunk_size):
+                chunks.append(chunk)
+                yield chunk
+        finally:
+            manager.__exit__(None, None, None)
+        self.cache.put(key, b"".join(chunks), extension=self.response_format)
+
+    def play_audio(self, audio_data, on_start=None):
+        """Play WAV bytes on the probed audio backend, blocking until playback ends.
+
+        on_start receives the playback object (anything with terminate()) so
+        callers can stop it early. Returns False if nothing could be played.
+        """
+        backend = self.audio_backend["backend"]
+        if backend == "pyglet":
             try:
-                proc = subprocess.Popen(
-                    ["ffplay", "-autoexit", "-nodisp", "-vn", "-nostats",
-                     "-loglevel", "error", "-af", "volume=0.5", "-"],
-                    stdin=subprocess.PIPE
-                )
-                proc.communicate(audio_data)
-                return
-            except Exception:
+                self.audio_player.play(audio_data, on_start=on_start)
+                return True
+            except Exception as e:
+                print(f"In-process playback failed, falling back to ffplay: {e}")
+        elif backend is None:
+            return False
+        return self._play_with_ffplay([audio_data], self.audio_backend["device"], on_start=on_start)
+
+    def play_stream(self, chunks, on_start=None):
+        """Play WAV bytes from an iterable of chunks as they arrive.
+
+        Time-to-first-sound depends only on the first chunk, not on the
+        length of the line. Returns False if nothing could be played. If
+        in-process playback fails before the stream's format was known, the
+        line is replayed on ffplay; once audio has started it is not.
+        """
+        backend = self.audio_backend["backend"]
+        if backend is None:
+            for _ in chunks:
                 pass
-                
-            # If that fails, try different audio devices
-            for device in self.audio_devices:
-                try:
-                    proc = subprocess.Popen(
-                        ["ffplay", "-autoexit", "-nodisp", "-vn", "-nostats",
-                         "-loglevel", "error", "-af", "volume=0.5",
-                         "-ao", device, "-"],
-                        stdin=subprocess.PIPE
-                    )
-                    proc.communicate(audio_data)
-                    break
-                except Exception as e:
-                    print(f"Failed to use audio device {device}: {e}")
-                    continue
-                    
+            return False
+        if backend == "pyglet":
+            consumed = []
+
+            def tee():
+                for chunk in chunks:
+                    consumed.append(chunk)
+                    yield chunk
+
+            try:
+                self.audio_player.play_stream(tee(), on_start=on_start)
+                return True
+            except Exception as e:
+                if parse_wav_header(b"".join(consumed)) is not None:
+                    # Playback had begun; replaying from the start would repeat the line
+                    print(f"In-process streaming failed mid-line: {e}")
+                    return True
+                print(f"In-process streaming failed, falling back to ffplay: {e}")
+            chunks = itertools.chain([b"".join(consumed)], chunks)
+        return self._play_with_ffplay(chunks, self.audio_backend["device"], on_start=on_start)
+
+    def _play_with_ffplay(self, chunks, device=None, on_start=None):
+        """Pipe WAV chunks into an ffplay subprocess on a known-good device; False if it failed"""
+        try:
+            proc = subprocess.Popen(ffplay_command(TTS_VOLUME), stdin=subprocess.PIPE,
+                                    env=ffplay_env(device))
+            if on_start:
+                on_start(proc)
+            try:
+                for chunk in chunks:
+                    if proc.poll() is not None:
+                        break
+                    proc.stdin.write(chunk)
+                    proc.stdin.flush()
+                proc.stdin.close()
+            except BrokenPipeError:
+                pass
+            proc.wait()
+            return True
+        except Exception as e:
+            print(f"ffplay playback failed on device {device or 'default'}: {e}")
+            return False
+
+    def speak_line(self, character, text):
+        """Synthesize and play a line, blocking the caller until it finishes.
+
+        Playback is driven by the pyglet clock, so call this from a worker
+        thread (see TTSWorker), never from the frame thread.
+        """
+        try:
+            if TTS_STREAMING:
+                self.play_stream(self.stream(character, text))
+            else:
+                self.play_audio(self.synthesize(character, text))
         except Exception as e:
-            print(f"TTS Error for {character}: {e}")
\ No newline at end of file
+            print(f"TTS Error for {character}: {e}")
@@ -0,0 +1,287 @@
+# tts_worker.py
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+import pyglet
+from audio_player import parse_wav_header, wav_duration
+from settings import TTS_PREFETCH_CONCURRENCY, TTS_PREFETCH_LOOKAHEAD, TTS_PREFETCH_STREAM_AHEAD, TTS_STREAMING
+from tts_controller import TTSController
+
+
+class SpeechHandle:
+    """Tracks one queued line of dialogue through synthesis and playback"""
+
+    PENDING = "pending"
+    SYNTHESIZING = "synthesizing"
+    PLAYING = "playing"
+    DONE = "done"
+    CANCELLED = "cancelled"
+    FAILED = "failed"
+
+    def __init__(self, character, text, on_complete=None, audio=None):
+        self.character = character
+        self.text = text
+        self.on_complete = on_complete
+        self.audio = audio
+        self.state = self.PENDING
+        self.error = None
+        self.started_at = None  # time.monotonic() when audio reached the player
+        self.duration = None    # Clip length in seconds, once known
+        self.played = False     # True once the clip actually went to an audio output
+        self._playback = None
+        self._lock = threading.Lock()
+
+    @property
+    def done(self):
+        """True once the line has finished, failed or been cancelled"""
+        return self.state in (self.DONE, self.CANCELLED, self.FAILED)
+
+    @property
+    def cancelled(self):
+        return self.state == self.CANCELLED
+
+    def remaining(self):
+        """Seconds of playback left, or None if the clip length isn't known yet"""
+        if self.started_at is None or self.duration is None:
+            return None
+        return max(0.0, self.started_at + self.duration - time.monotonic())
+
+    def cancel(self):
+        """Stop the line, killing playback if it has already started"""
+        with self._lock:
+            if self.done:
+                return
+            self.state = self.CANCELLED
+            playback = self._playback
+        if playback:
+            playback.terminate()
+
+    def _mark_started(self, duration=None):
+        """Record that audio has reached the player (and its length, if now known)"""
+        if self.started_at is None:
+            self.started_at = time.monotonic()
+        if duration is not None and self.duration is None:
+            self.duration = duration
+
+    def _attach_playback(self, playback):
+        with self._lock:
+            self._playback = playback
+            cancelled = self.cancelled
+        if cancelled:
+            playback.terminate()
+
+    def _set_state(self, state):
+        """Advance the state unless the handle was cancelled meanwhile"""
+        with self._lock:
+            if self.cancelled:
+                return False
+            self.state = state
+            return True
+
+
+class TTSWorker:
+    """Runs TTS synthesis and playback on a background thread.
+
+    Completion callbacks are queued by the worker and dispatched from the
+    pyglet clock, so they always run on the window's frame thread.
+    """
+
+    def __init__(self, controller=None):
+        self.controller = controller or TTSController()
+        self._requests = queue.Queue()
+        self._completed = queue.SimpleQueue()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="tts-worker", daemon=True)
+        self._thread.start()
+        pyglet.clock.schedule_interval(self._dispatch_callbacks, 1 / 60)
+
+    def speak(self, character, text, on_complete=None, audio=None):
+        """Queue a line for synthesis and playback, returning its handle.
+
+        audio may be a Future (e.g. from ScenePrefetcher) that resolves to the
+        line's WAV bytes; the worker waits on it instead of synthesizing.
+        """
+        handle = SpeechHandle(character, text, on_complete, audio)
+        self._requests.put(handle)
+        return handle
+
+    def cancel_all(self):
+        """Cancel every queued line"""
+        while True:
+            try:
+                handle = self._requests.get_nowait()
+            except queue.Empty:
+                break
+            handle.cancel()
+            self._completed.put(handle)
+
+    def shutdown(self):
+        """Stop the worker thread and unschedule callback dispatch"""
+        self._running = False
+        self.cancel_all()
+        self._requests.put(None)
+        pyglet.clock.unschedule(self._dispatch_callbacks)
+
+    def _run(self):
+        while self._running:
+            handle = self._requests.get()
+            if handle is None:
+                break
+            self._process(handle)
+            self._completed.put(handle)
+
+    def _process(self, handle):
+        if not handle._set_state(SpeechHandle.SYNTHESIZING):
+            return
+        try:
+            prefetched = isinstance(handle.audio, Future)
+            if TTS_STREAMING and not (prefetched and handle.audio.done()):
+                # Audio isn't ready yet; stream so playback starts on the first chunk
+                play = self.controller.play_stream
+                audio = self._track_stream(handle, self.controller.stream(handle.character, handle.text))
+            elif prefetched:
+                play, audio = self.controller.play_audio, handle.audio.result()
+            else:
+                play = self.controller.play_audio
+                audio = self.controller.synthesize(handle.character, handle.text)
+            if isinstance(audio, bytes):
+                handle.duration = wav_duration(audio)
+            if not handle._set_state(SpeechHandle.PLAYING):
+                return
+
+            def on_start(playback):
+                handle._attach_playback(playback)
+                if isinstance(audio, bytes):
+                    handle._mark_started()  # A stream is marked started by its first audio instead
+
+            handle.played = bool(play(audio, on_start=on_start))
+            handle._set_state(SpeechHandle.DONE)
+        except Exception as e:
+            print(f"TTS Error for {handle.character}: {e}")
+            handle.error = e
+            handle._set_state(SpeechHandle.FAILED)
+
+    @staticmethod
+    def _track_stream(handle, chunks):
+        """Pass chunks through, marking the handle started once the first audio arrives.
+
+        Players call on_start before the request has even opened, so that
+        would make a stalled or rate-limited stream look like it's playing.
+        The clip length is taken from the WAV header when it declares one.
+        """
+        header = b""
+        try:
+            for chunk in chunks:
+                if handle.started_at is None and chunk:
+                    header += chunk
+                    try:
+                        parsed = parse_wav_header(header)
+                    except ValueError:
+                        parsed = (None, 0, None)  # Not a WAV; the player will report it
+                    if parsed is not None:
+                        audio_format, _, data_size = parsed
+                        duration = data_size / audio_format.bytes_per_second if data_size and audio_format else None
+                        handle._mark_started(duration)
+                yield chunk
+        finally:
+            if hasattr(chunks, "close"):
+                chunks.close()
+
+    def _dispatch_callbacks(self, delta_time):
+        """Run completion callbacks on the pyglet clock (frame thread)"""
+        while True:
+            try:
+                handle = self._completed.get_nowait()
+            except queue.Empty:
+                break
+            if handle.on_complete:
+                try:
+                    handle.on_complete(handle)
+                except Exception as e:
+                    print(f"TTS callback error: {e}")
+
+
+class ScenePrefetcher:
+    """Synthesizes a scene's dialogue ahead of playback.
+
+    Every line is submitted at scene load with bounded concurrency so the
+    audio lands in the disk cache. Only clips inside the look-ahead window
+    are kept in memory; lines outside it are re-read from the cache on demand.
+
+    The first stream_ahead lines from the current one (by default the
+    current and next line, when TTS_STREAMING is on) are left to the worker
+    to stream: waiting on a whole-clip synthesis of the line about to be
+    spoken would lose streaming's time-to-first-sound.
+    """
+
+    def __init__(self, controller, dialogue, concurrency=TTS_PREFETCH_CONCURRENCY,
+                 lookahead=TTS_PREFETCH_LOOKAHEAD, stream_ahead=None):
+        self.controller = controller
+        self.dialogue = dialogue
+        self.lookahead = lookahead
+        if stream_ahead is None:
+            stream_ahead = TTS_PREFETCH_STREAM_AHEAD if TTS_STREAMING else 0
+        self.stream_ahead = stream_ahead
+        self.current_line = 0
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="tts-prefetch")
+        self._futures = {}  # line index -> Future[bytes]
+        self._lock = threading.Lock()
+        for index in range(stream_ahead, len(dialogue)):
+            self._submit(index)
+
+    def get(self, index):
+        """Return a Future for the audio of line index (None if it is to be streamed), slide the window to it"""
+        self.advance(index)
+        with self._lock:
+            future = self._futures.get(index)
+        if future is None and not self._streamed(index):
+            future = self._submit(index)
+        return future
+
+    def prefetch(self, index):
+        """Start synthesizing line index, e.g. after it was appended to the dialogue"""
+        if self._streamed(index):
+            return None
+        return self._submit(index)
+
+    def ready(self, index):
+        """True if the clip for line index is already synthesized and in memory"""
+        with self._lock:
+            future = self._futures.get(index)
+        return future is not None and future.done() and not future.exception()
+
+    def advance(self, current_line):
+        """Keep clips for the next lookahead lines and release the rest"""
+        count = len(self.dialogue)
+        if not count:
+            return
+        self.current_line = current_line
+        window = {(current_line + i) % count for i in range(self.lookahead + 1)}
+        with self._lock:
+            for index in list(self._futures):
+                if index not in window and self._futures[index].done():
+                    del self._futures[index]
+            missing = [i for i in window if i not in self._futures and not self._streamed(i)]
+        for index in missing:
+            self._submit(index)
+
+    def shutdown(self):
+        """Cancel pending synthesis and stop the pool"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _streamed(self, index):
+        """True if line index is among the lines the worker streams itself"""
+        count = len(self.dialogue)
+        return count > 0 and (index - self.current_line) % count < self.stream_ahead
+
+    def _submit(self, index):
+        line = self.dialogue[index]
+        character = list(line.keys())[0]
+        text = list(line.values())[0]
+        with self._lock:
+            future = self._futures.get(index)
+            if future is None:
+                future = self._executor.submit(self.controller.synthesize, character, text)
+                self._futures[index] = future
+        return future